@@ -10,20 +10,59 @@ Uses linearmodels.PanelOLS for proper handling of high-dimensional fixed effects
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from linearmodels.panel import PanelOLS
-import statsmodels.api as sm
+from linearmodels.panel.utility import AbsorbingEffectWarning
+from linearmodels.shared.exceptions import MissingValueWarning, SingletonWarning
+import scipy.sparse as sp
+from scipy.sparse.linalg import lsmr
+import argparse
+import os
 import warnings
-warnings.filterwarnings('ignore')
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Use numba for the cluster-robust kernel if available
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
 
 # =============================================================================
 # LOAD DATA
 # =============================================================================
 
+DATA_PATH = 'original/data/modified/analysis.dta'
+CACHE_PATH = 'original/data/modified/analysis.parquet'
+
+
 def load_data():
-    """Load the original analysis dataset."""
-    df = pd.read_stata('original/data/modified/analysis.dta')
+    """
+    Load the original analysis dataset.
+
+    The parsed .dta is cached as a Parquet sidecar and reused for as long as
+    it is newer than the .dta file.
+    """
+    if os.path.exists(CACHE_PATH) and os.path.getmtime(CACHE_PATH) >= os.path.getmtime(DATA_PATH):
+        df = pd.read_parquet(CACHE_PATH, engine='pyarrow')
+        if 'state_year_code' in df:
+            return df
+
+    df = pd.read_stata(DATA_PATH)
     # Create state_year string for reference
     df['state_year'] = df['state'] + '_' + df['year'].astype(str)
+    # Low-cardinality string columns are much smaller and faster as categoricals
+    for col in ['state', 'county', 'state_year']:
+        df[col] = df[col].astype('category')
+    # Sorted int32 codes for the fixed-effect ids, shared by every regression
+    for col, code_col in [('county_id', 'county_code'), ('state_year_id', 'state_year_code')]:
+        codes, _ = pd.factorize(df[col], sort=True)
+        df[code_col] = codes.astype(np.int32)
+
+    df.to_parquet(CACHE_PATH, engine='pyarrow', compression='zstd', index=False)
     return df
 
 
@@ -32,18 +71,26 @@ def prepare_dem_voteshare_data(df):
     Prepare pooled democratic vote share data (gubernatorial, presidential, senatorial).
     This matches the Stata reshape in the original code for Table 2 cols 4-6.
     """
-    keep_cols = ['state', 'county', 'county_id', 'year', 'treat', 'year2', 'state_year_id']
+    keep_cols = ['state', 'county', 'county_id', 'year', 'treat', 'year2', 'state_year_id',
+                 'county_code', 'state_year_code']
     dem_cols = ['dem_share_gov', 'dem_share_pres', 'dem_share_sen']
 
-    # Reshape long
-    df_long = df[keep_cols + dem_cols].melt(
-        id_vars=keep_cols,
-        value_vars=dem_cols,
-        var_name='office',
-        value_name='dem_share'
+    # Reshape long: stack the three vote-share columns office by office and
+    # repeat the id columns to match, keeping only non-missing vote shares
+    n = len(df)
+    dem_share = np.concatenate([df[col].to_numpy(dtype=float) for col in dem_cols])
+    rows = np.tile(np.arange(n), len(dem_cols))
+    office_codes = np.repeat(np.arange(len(dem_cols)), n)
+
+    valid = np.isfinite(dem_share)
+    rows = rows[valid]
+
+    data = {col: df[col].array.take(rows) for col in keep_cols}
+    data['office'] = pd.Categorical.from_codes(
+        office_codes[valid], categories=[col.replace('dem_share_', '') for col in dem_cols]
     )
-    df_long['office'] = df_long['office'].str.replace('dem_share_', '')
-    df_long = df_long.dropna(subset=['dem_share'])
+    data['dem_share'] = dem_share[valid]
+    df_long = pd.DataFrame(data)
 
     return df_long
 
@@ -52,179 +99,385 @@ def prepare_dem_voteshare_data(df):
 # REGRESSION FUNCTIONS
 # =============================================================================
 
-def run_panel_regression(df, y_var, x_var='treat', sample_filter=None, trend_type='none'):
+@contextmanager
+def suppress_known_warnings():
     """
-    Run two-way fixed effects panel regression with clustered standard errors.
+    Silence linearmodels' expected fit-time warnings (absorbed columns,
+    singleton and missing-value notices) without hiding warnings elsewhere.
+    """
+    with warnings.catch_warnings():
+        for category in (AbsorbingEffectWarning, MissingValueWarning, SingletonWarning):
+            warnings.simplefilter('ignore', category)
+        yield
 
-    Implements: Y_cst = beta*treat + county_FE + state_year_FE + [trends] + epsilon
-    Clustered SEs at county level.
+
+@dataclass
+class SampleCache:
+    """
+    Estimation sample for one outcome, shared across trend specifications.
+
+    Holds the numeric arrays for y and x, contiguous integer codes for the
+    county and state-year fixed effects, and the within-county trend basis.
+    """
+    y_var: str
+    x_var: str
+    y: np.ndarray
+    x: np.ndarray
+    entity_codes: np.ndarray
+    n_entities: int
+    time_codes: np.ndarray
+    n_times: int
+    year_dm: np.ndarray
+    year2_dm: np.ndarray
+
+    @property
+    def n_obs(self):
+        return len(self.y)
+
+
+def _group_sum(x, codes, n_groups):
+    """Sum x (1-D, or 2-D column-wise) within groups given as contiguous integer codes."""
+    if x.ndim == 1:
+        return np.bincount(codes, weights=x, minlength=n_groups)
+    return np.column_stack([np.bincount(codes, weights=col, minlength=n_groups) for col in x.T])
+
+
+def _group_demean(x, codes, n_groups):
+    """Subtract group means from x (1-D, or 2-D column-wise), with groups given as contiguous integer codes."""
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = _group_sum(x, codes, n_groups)
+    means = sums / (counts if x.ndim == 1 else counts[:, None])
+    return x - means[codes]
+
+
+def _county_slope(v, basis, codes, n_groups):
+    """Per-county OLS slope of v on a within-county demeaned trend, broadcast to rows."""
+    num = _group_sum(v * (basis if v.ndim == 1 else basis[:, None]), codes, n_groups)
+    den = np.bincount(codes, weights=basis * basis, minlength=n_groups)
+    if v.ndim > 1:
+        den = den[:, None]
+    slope = np.divide(num, den, out=np.zeros_like(num), where=den > 1e-8)
+    return slope[codes]
+
+
+def _compact_codes(codes):
+    """Renumber a subset of sorted global codes to 0..n-1, preserving order."""
+    present = np.bincount(codes) > 0
+    remap = np.cumsum(present) - 1
+    return remap[codes], int(present.sum())
+
+
+def prepare_sample(df, y_var, x_var='treat', sample_filter=None):
+    """
+    Build the estimation sample for one outcome.
+
+    The filtering, missing-value handling, fixed-effect coding and trend basis
+    are identical across trend specifications, so they are computed once here
+    and reused by run_panel_regression for each trend type.
 
     Parameters:
     -----------
     df : DataFrame
     y_var : str - outcome variable
     x_var : str - treatment variable (default 'treat')
-    sample_filter : Series of bool or None - rows to include
-    trend_type : str - 'none', 'linear', or 'quadratic'
+    sample_filter : boolean mask (Series or array) or None - rows to include
 
     Returns:
     --------
-    dict with coef, se, n_obs, n_counties, n_elections
+    SampleCache
     """
 
-    # Apply sample filter
+    # Row positions passing the sample filter; columns are sliced straight to
+    # arrays so no subset DataFrame is ever materialized
     if sample_filter is not None:
-        sample = df[sample_filter].copy()
+        idx = np.flatnonzero(np.asarray(sample_filter, dtype=bool))
     else:
-        sample = df.copy()
+        idx = slice(None)
+
+    cols_needed = [y_var, x_var, 'year', 'year2']
+    arrays = {col: df[col].to_numpy(dtype=float)[idx] for col in cols_needed}
+    codes = {col: df[col].to_numpy()[idx] for col in ['county_code', 'state_year_code']}
+
+    # Drop rows with any missing value (missing ids are factorized to -1)
+    valid = np.ones(len(arrays[y_var]), dtype=bool)
+    for arr in arrays.values():
+        valid &= np.isfinite(arr)
+    for arr in codes.values():
+        valid &= arr >= 0
+    arrays = {col: arr[valid] for col, arr in arrays.items()}
+
+    # Contiguous integer codes for the fixed-effect groups in this sample. In
+    # single-state samples (Table 3 VBM share, CA only) the state-year codes
+    # coincide with year codes, so no separate time-effect path is needed.
+    entity_codes, n_entities = _compact_codes(codes['county_code'][valid])
+    time_codes, n_times = _compact_codes(codes['state_year_code'][valid])
+
+    # Orthogonal within-county trend basis: year, then year^2 net of year
+    year_dm = _group_demean(arrays['year'], entity_codes, n_entities)
+    year2_dm = _group_demean(arrays['year2'], entity_codes, n_entities)
+    year2_dm = year2_dm - year_dm * _county_slope(year2_dm, year_dm, entity_codes, n_entities)
+
+    return SampleCache(
+        y_var=y_var,
+        x_var=x_var,
+        y=arrays[y_var],
+        x=arrays[x_var],
+        entity_codes=entity_codes,
+        n_entities=n_entities,
+        time_codes=time_codes,
+        n_times=n_times,
+        year_dm=year_dm,
+        year2_dm=year2_dm,
+    )
+
+
+def within_transform(cache, trend_type='none', tol=1e-10, max_iter=1000):
+    """
+    Residualize y and x on county FE + state-year FE [+ county-specific trends].
+
+    Alternates between projecting out each county's mean (and polynomial time
+    trend, if requested) and the state-year means until convergence. By
+    Frisch-Waugh-Lovell, regressing the residualized outcome on the
+    residualized treatment recovers the same coefficient as including every
+    fixed effect and county-by-year interaction as a regressor.
+
+    Returns:
+    --------
+    (N x 2 array of residualized [y, x], converged flag)
+    """
+    basis = []
+    if trend_type in ['linear', 'quadratic']:
+        basis.append(cache.year_dm)
+    if trend_type == 'quadratic':
+        basis.append(cache.year2_dm)
+
+    M = np.column_stack([cache.y, cache.x])
+    for _ in range(max_iter):
+        new = _group_demean(M, cache.entity_codes, cache.n_entities)
+        for b in basis:
+            new = new - b[:, None] * _county_slope(new, b, cache.entity_codes, cache.n_entities)
+        new = _group_demean(new, cache.time_codes, cache.n_times)
+        if np.max(np.abs(new - M)) < tol:
+            return new, True
+        M = new
+    return M, False
+
+
+def cr1_meat(X, u, group_codes, n_groups):
+    """Cluster-robust meat sum_g (X_g' u_g)(X_g' u_g)' for an N x k regressor matrix."""
+    xu = _group_sum(X * u[:, None], group_codes, n_groups)
+    return xu.T @ xu
+
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def cr1_meat(X, u, group_codes, n_groups):
+        """Cluster-robust meat sum_g (X_g' u_g)(X_g' u_g)' for an N x k regressor matrix."""
+        n, k = X.shape
+        xu = np.zeros((n_groups, k))
+        for i in range(n):
+            g = group_codes[i]
+            for j in range(k):
+                xu[g, j] += X[i, j] * u[i]
+        return xu.T @ xu
+
+
+def cluster_robust_se(X, u, group_codes, n_groups):
+    """
+    CR1 cluster-robust standard errors for OLS of u's outcome on X.
+
+    Uses the same G/(G-1) * (N-1)/(N-k) small-sample scaling as statsmodels'
+    cluster covariance. k is at most a handful of columns, so the bread is
+    a tiny dense solve.
+    """
+    n, k = X.shape
+    meat = cr1_meat(X, u, group_codes, n_groups)
+    xx = X.T @ X
+    cov = np.linalg.solve(xx, np.linalg.solve(xx, meat).T)
+    cov *= n_groups / (n_groups - 1) * (n - 1) / (n - k)
+    return np.sqrt(np.diag(cov))
+
+
+def run_lsmr_regression(cache, trend_type='none'):
+    """
+    Solve the full LSDV system (treat, county and state-year dummies, county
+    trends) as a sparse least-squares problem with LSMR.
+
+    No dense county dummy or county-by-year matrix is ever materialized: each
+    fixed-effect block has one nonzero per row. If either LSMR solve stops at
+    its iteration limit, the within estimator (run_manual_twfe) is used.
+    """
 
-    # Select needed columns and drop missing
-    cols_needed = [y_var, x_var, 'county_id', 'state_year_id', 'year', 'year2']
-    sample = sample[cols_needed].dropna().copy()
+    n = cache.n_obs
+    rows = np.arange(n)
+
+    # The design is stored as float32: the dummies and treat are exactly 0/1
+    # and the demeaned trends are small-magnitude, while LSMR's iterates and
+    # y stay float64. Once converged, treat's coefficient matches a dense
+    # float64 LSDV to about 1e-7 relative (4e-8 with a float64 design).
+    def block(codes, n_cols, values):
+        return sp.csc_matrix((values.astype(np.float32), (rows, codes)), shape=(n, n_cols))
+
+    ones = np.ones(n)
+    fe_blocks = [
+        block(cache.entity_codes, cache.n_entities, ones),
+        block(cache.time_codes, cache.n_times, ones),
+    ]
+    if trend_type in ['linear', 'quadratic']:
+        fe_blocks.append(block(cache.entity_codes, cache.n_entities, cache.year_dm))
+    if trend_type == 'quadratic':
+        fe_blocks.append(block(cache.entity_codes, cache.n_entities, cache.year2_dm))
+    B = sp.hstack(fe_blocks, format='csc')
+    A = sp.hstack([block(np.zeros(n, dtype=int), 1, cache.x), B], format='csc')
+
+    # LSMR's default limit, min(A.shape), is too few iterations for the
+    # ill-conditioned trend blocks, so allow up to 20 per column
+    maxiter = 20 * A.shape[1]
+    beta, istop = lsmr(A, cache.y, atol=1e-10, btol=1e-10, maxiter=maxiter)[:2]
+    # Treatment net of the fixed effects and trends, for the sandwich
+    gamma, istop_x = lsmr(B, cache.x, atol=1e-10, btol=1e-10, maxiter=maxiter)[:2]
+    if istop == 7 or istop_x == 7:
+        print("  Warning: LSMR reached the iteration limit, using the within estimator")
+        return run_manual_twfe(cache, trend_type)
+    x_tilde = cache.x - B @ gamma
+
+    resid = cache.y - A @ beta
+    return {
+        'coef': beta[0],
+        'se': cluster_robust_se(x_tilde[:, None], resid, cache.entity_codes, cache.n_entities)[0],
+        'n_obs': n,
+        'n_counties': cache.n_entities,
+        'n_elections': cache.n_times
+    }
+
+
+def run_panel_regression(cache, trend_type='none', method='panelols'):
+    """
+    Run two-way fixed effects panel regression with clustered standard errors.
+
+    Implements: Y_cst = beta*treat + county_FE + state_year_FE + [trends] + epsilon
+    Clustered SEs at county level.
+
+    Parameters:
+    -----------
+    cache : SampleCache - estimation sample from prepare_sample
+    trend_type : str - 'none', 'linear', or 'quadratic'
+    method : str - 'panelols' (default) or 'lsmr' for a sparse LSDV solve
+
+    Returns:
+    --------
+    dict with coef, se, n_obs, n_counties, n_elections
+    """
 
-    if len(sample) == 0:
+    if cache.n_obs == 0:
         return None
 
-    # Ensure numeric types
-    sample[y_var] = sample[y_var].astype(float)
-    sample[x_var] = sample[x_var].astype(float)
-    sample['county_id'] = sample['county_id'].astype(int)
-    sample['state_year_id'] = sample['state_year_id'].astype(int)
-    sample['year'] = sample['year'].astype(float)
-    sample['year2'] = sample['year2'].astype(float)
+    if method == 'lsmr':
+        return run_lsmr_regression(cache, trend_type)
 
-    # Build exogenous variables
-    exog_cols = [x_var]
+    y_var, x_var = cache.y_var, cache.x_var
+    y, x = cache.y, cache.x
 
     # Add county-specific trends if requested
     if trend_type in ['linear', 'quadratic']:
-        # Demean year within county for numerical stability
-        sample['year_dm'] = sample['year'] - sample.groupby('county_id')['year'].transform('mean')
-        exog_cols.append('year_dm')
-
-        # Create county-specific linear trend interactions
-        # We use the absorbed FE approach: include year interacted with county dummies
-        # But PanelOLS doesn't directly support this, so we add as exog variables
-        county_ids = sorted(sample['county_id'].unique())
-        for i, cid in enumerate(county_ids[1:]):  # Drop first for identification
-            col_name = f'ctrend_{cid}'
-            sample[col_name] = ((sample['county_id'] == cid).astype(float) * sample['year_dm']).values
-            exog_cols.append(col_name)
+        # Partial the county trends out of y and x (Frisch-Waugh-Lovell) rather
+        # than adding one year-by-county interaction column per county to exog
+        M, converged = within_transform(cache, trend_type)
+        if not converged:
+            print("  Warning: within transformation did not converge")
+        y, x = M[:, 0], M[:, 1]
+
+    # Set up panel index straight from the contiguous codes, which are already
+    # sorted, so no per-regression factorize/sort of the id columns is needed
+    index = pd.MultiIndex(
+        levels=[np.arange(cache.n_entities), np.arange(cache.n_times)],
+        codes=[cache.entity_codes, cache.time_codes],
+        names=['entity', 'time'],
+        verify_integrity=False,
+    )
 
-    if trend_type == 'quadratic':
-        sample['year2_dm'] = sample['year2'] - sample.groupby('county_id')['year2'].transform('mean')
-        county_ids = sorted(sample['county_id'].unique())
-        for i, cid in enumerate(county_ids[1:]):
-            col_name = f'ctrend2_{cid}'
-            sample[col_name] = ((sample['county_id'] == cid).astype(float) * sample['year2_dm']).values
-            exog_cols.append(col_name)
-
-    # Set up panel index
-    sample = sample.reset_index(drop=True)
-    sample['entity'] = sample['county_id']
-    sample['time'] = sample['state_year_id']
-    sample = sample.set_index(['entity', 'time'])
-
-    # Prepare exogenous variables with constant
-    exog = sample[exog_cols].copy()
-    exog = sm.add_constant(exog, has_constant='add')
+    # Prepare exogenous variables with constant as one contiguous array,
+    # wrapped in a DataFrame only for PanelOLS' column names
+    X = np.empty((cache.n_obs, 2))
+    X[:, 0] = 1.0
+    X[:, 1] = x
+    exog = pd.DataFrame(X, index=index, columns=['const', x_var])
 
     # Run PanelOLS with entity and time effects
     try:
-        model = PanelOLS(
-            dependent=sample[y_var],
-            exog=exog,
-            entity_effects=True,
-            time_effects=True,
-            drop_absorbed=True
-        )
-        results = model.fit(cov_type='clustered', cluster_entity=True)
+        with suppress_known_warnings():
+            model = PanelOLS(
+                dependent=pd.Series(y, index=index, name=y_var),
+                exog=exog,
+                entity_effects=True,
+                time_effects=True,
+                drop_absorbed=True
+            )
+            results = model.fit(cov_type='clustered', cluster_entity=True)
 
         coef = results.params[x_var]
         se = results.std_errors[x_var]
     except Exception as e:
         # Fallback to manual demeaning approach
         print(f"  Warning: PanelOLS failed ({e}), using fallback")
-        return run_manual_twfe(df, y_var, x_var, sample_filter, trend_type)
+        return run_manual_twfe(cache, trend_type)
 
     return {
         'coef': coef,
         'se': se,
         'n_obs': int(results.nobs),
-        'n_counties': sample.index.get_level_values('entity').nunique(),
-        'n_elections': sample.index.get_level_values('time').nunique()
+        'n_counties': cache.n_entities,
+        'n_elections': cache.n_times
     }
 
 
-def run_manual_twfe(df, y_var, x_var='treat', sample_filter=None, trend_type='none'):
+def run_manual_twfe(cache, trend_type='none'):
     """
     Fallback: Manual two-way fixed effects via within transformation.
     """
 
-    # Apply sample filter
-    if sample_filter is not None:
-        sample = df[sample_filter].copy()
-    else:
-        sample = df.copy()
-
-    cols_needed = [y_var, x_var, 'county_id', 'state_year_id', 'year', 'year2']
-    sample = sample[cols_needed].dropna().copy()
-
-    if len(sample) == 0:
+    if cache.n_obs == 0:
         return None
 
-    # Ensure numeric
-    for col in cols_needed:
-        sample[col] = sample[col].astype(float)
-    sample['county_id'] = sample['county_id'].astype(int)
-    sample['state_year_id'] = sample['state_year_id'].astype(int)
-
-    # Within transformation: demean by county and state-year
-    # First demean by county
-    for var in [y_var, x_var]:
-        sample[f'{var}_dm1'] = sample[var] - sample.groupby('county_id')[var].transform('mean')
-
-    # Then demean by state-year
-    for var in [y_var, x_var]:
-        sample[f'{var}_dm'] = sample[f'{var}_dm1'] - sample.groupby('state_year_id')[f'{var}_dm1'].transform('mean')
+    # Within transformation: demean by county and state-year (and county
+    # trends) until convergence
+    M, converged = within_transform(cache, trend_type)
+    if not converged:
+        print("  Warning: within transformation did not converge")
 
-    # Add back the grand mean (not strictly necessary but cleaner)
-    y = sample[f'{y_var}_dm']
-    X = sample[[f'{x_var}_dm']]
+    # OLS on demeaned data, clustered by county
+    y, X = M[:, 0], M[:, 1:]
+    params = np.linalg.lstsq(X, y, rcond=None)[0]
+    se = cluster_robust_se(X, y - X @ params, cache.entity_codes, cache.n_entities)
 
-    if trend_type != 'none':
-        # Add demeaned trends
-        sample['year_dm'] = sample['year'] - sample.groupby('county_id')['year'].transform('mean')
-        sample['year_dm'] = sample['year_dm'] - sample.groupby('state_year_id')['year_dm'].transform('mean')
-        X = pd.concat([X, sample[['year_dm']]], axis=1)
+    return {
+        'coef': params[0],
+        'se': se[0],
+        'n_obs': cache.n_obs,
+        'n_counties': cache.n_entities,
+        'n_elections': cache.n_times
+    }
 
-    if trend_type == 'quadratic':
-        sample['year2_dm'] = sample['year2'] - sample.groupby('county_id')['year2'].transform('mean')
-        sample['year2_dm'] = sample['year2_dm'] - sample.groupby('state_year_id')['year2_dm'].transform('mean')
-        X = pd.concat([X, sample[['year2_dm']]], axis=1)
 
-    # OLS on demeaned data
-    model = sm.OLS(y, X)
-    # Clustered SEs - need to adjust DoF for absorbed FEs
-    n_counties = sample['county_id'].nunique()
-    n_state_years = sample['state_year_id'].nunique()
+def _run_one(spec):
+    """Run one (cache, trend) spec; module level so worker processes can pickle it."""
+    cache, trend = spec
+    return run_panel_regression(cache, trend_type=trend)
 
-    results = model.fit(cov_type='cluster', cov_kwds={'groups': sample['county_id']})
 
-    return {
-        'coef': results.params[f'{x_var}_dm'],
-        'se': results.bse[f'{x_var}_dm'],
-        'n_obs': len(sample),
-        'n_counties': n_counties,
-        'n_elections': n_state_years
-    }
+def run_trend_specs(cache, trend_types, executor=None):
+    """Run one regression per trend type, in worker processes if an executor is given."""
+    specs = [(cache, trend) for trend in trend_types]
+    if executor is None:
+        return [_run_one(spec) for spec in specs]
+    return list(executor.map(_run_one, specs))
 
 
 # =============================================================================
 # TABLE 2: PARTISAN OUTCOMES
 # =============================================================================
 
-def replicate_table2(df):
+def replicate_table2(df, executor=None):
     """
     Replicate Table 2: Partisan Outcomes
 
@@ -243,14 +496,11 @@ def replicate_table2(df):
 
     filter_ca_ut = df['state'].isin(['CA', 'UT'])
 
+    cache = prepare_sample(df, 'share_votes_dem', sample_filter=filter_ca_ut)
+
     trend_types = ['none', 'linear', 'quadratic']
-    for i, trend in enumerate(trend_types, 1):
-        res = run_panel_regression(
-            df=df,
-            y_var='share_votes_dem',
-            sample_filter=filter_ca_ut,
-            trend_type=trend
-        )
+    fits = run_trend_specs(cache, trend_types, executor)
+    for i, (trend, res) in enumerate(zip(trend_types, fits), 1):
         if res:
             results[f'dem_turnout_col{i}'] = res
             print(f"  Col {i} ({trend:10s}): coef = {res['coef']:8.4f}, se = ({res['se']:.4f}), "
@@ -261,14 +511,10 @@ def replicate_table2(df):
     print("\n--- Democratic Vote Share (pooled gov/pres/sen, all states) ---")
 
     df_long = prepare_dem_voteshare_data(df)
+    cache = prepare_sample(df_long, 'dem_share')
 
-    for i, trend in enumerate(trend_types, 4):
-        res = run_panel_regression(
-            df=df_long,
-            y_var='dem_share',
-            sample_filter=None,
-            trend_type=trend
-        )
+    fits = run_trend_specs(cache, trend_types, executor)
+    for i, (trend, res) in enumerate(zip(trend_types, fits), 4):
         if res:
             results[f'dem_voteshare_col{i}'] = res
             print(f"  Col {i} ({trend:10s}): coef = {res['coef']:8.4f}, se = ({res['se']:.4f}), "
@@ -281,7 +527,7 @@ def replicate_table2(df):
 # TABLE 3: PARTICIPATION OUTCOMES
 # =============================================================================
 
-def replicate_table3(df):
+def replicate_table3(df, executor=None):
     """
     Replicate Table 3: Participation Outcomes
 
@@ -298,14 +544,11 @@ def replicate_table3(df):
     # ----- TURNOUT SHARE (Columns 1-3) -----
     print("\n--- Turnout Share (all states) ---")
 
+    cache = prepare_sample(df, 'turnout_share')
+
     trend_types = ['none', 'linear', 'quadratic']
-    for i, trend in enumerate(trend_types, 1):
-        res = run_panel_regression(
-            df=df,
-            y_var='turnout_share',
-            sample_filter=None,
-            trend_type=trend
-        )
+    fits = run_trend_specs(cache, trend_types, executor)
+    for i, (trend, res) in enumerate(zip(trend_types, fits), 1):
         if res:
             results[f'turnout_col{i}'] = res
             print(f"  Col {i} ({trend:10s}): coef = {res['coef']:8.4f}, se = ({res['se']:.4f}), "
@@ -315,14 +558,10 @@ def replicate_table3(df):
     print("\n--- VBM Share (CA only) ---")
 
     filter_ca = df['state'] == 'CA'
+    cache = prepare_sample(df, 'vbm_share', sample_filter=filter_ca)
 
-    for i, trend in enumerate(trend_types, 4):
-        res = run_panel_regression(
-            df=df,
-            y_var='vbm_share',
-            sample_filter=filter_ca,
-            trend_type=trend
-        )
+    fits = run_trend_specs(cache, trend_types, executor)
+    for i, (trend, res) in enumerate(zip(trend_types, fits), 4):
         if res:
             results[f'vbm_col{i}'] = res
             print(f"  Col {i} ({trend:10s}): coef = {res['coef']:8.4f}, se = ({res['se']:.4f}), "
@@ -384,12 +623,23 @@ def print_comparison(replicated, original, table_name):
             print(f"{key:<20} {orig['coef']:>8.4f} ({orig['se']:.3f}) {'N/A':>16} {'N/A':>12} {'N/A':>8}")
 
 
+def write_csv(columns, path):
+    """Write a dict of equal-length columns to CSV via pyarrow; NaN/None are written as empty cells."""
+    table = pa.Table.from_pydict({name: pa.array(values, from_pandas=True) for name, values in columns.items()})
+    pacsv.write_csv(table, path, write_options=pacsv.WriteOptions(quoting_style='none', quoting_header='none'))
+
+
 # =============================================================================
 # MAIN
 # =============================================================================
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Replicate Thompson et al. (2020) Tables 2 and 3")
+    parser.add_argument('--parallel', action='store_true',
+                        help="run the regressions in worker processes, one per CPU core")
+    args = parser.parse_args()
+
     print("="*70)
     print("REPLICATION OF THOMPSON ET AL. (2020)")
     print("Universal vote-by-mail has no impact on partisan turnout or vote share")
@@ -398,13 +648,19 @@ if __name__ == "__main__":
     print("\nLoading data...")
     df = load_data()
     print(f"Loaded {len(df)} observations from analysis.dta")
-    print(f"  - CA: {(df['state']=='CA').sum()} obs, {df[df['state']=='CA']['county'].nunique()} counties")
-    print(f"  - UT: {(df['state']=='UT').sum()} obs, {df[df['state']=='UT']['county'].nunique()} counties")
-    print(f"  - WA: {(df['state']=='WA').sum()} obs, {df[df['state']=='WA']['county'].nunique()} counties")
+    counts = df.groupby('state', observed=True).agg(n=('county', 'size'), nc=('county', 'nunique'))
+    for st in ('CA', 'UT', 'WA'):
+        n_obs, n_counties = counts.loc[st] if st in counts.index else (0, 0)
+        print(f"  - {st}: {n_obs} obs, {n_counties} counties")
 
     # Run replications
-    table2_results = replicate_table2(df)
-    table3_results = replicate_table3(df)
+    if args.parallel:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            table2_results = replicate_table2(df, executor)
+            table3_results = replicate_table3(df, executor)
+    else:
+        table2_results = replicate_table2(df)
+        table3_results = replicate_table3(df)
 
     # Get original values
     orig_table2, orig_table3 = get_original_values()
@@ -421,52 +677,37 @@ if __name__ == "__main__":
     all_results = {**table2_results, **table3_results}
     all_original = {**orig_table2, **orig_table3}
 
-    rows = []
-    for key in sorted(all_original.keys()):
-        orig = all_original[key]
-        repl = all_results.get(key, {})
-        rows.append({
-            'specification': key,
-            'original_coef': orig['coef'],
-            'original_se': orig['se'],
-            'original_counties': orig.get('n_counties', ''),
-            'replicated_coef': repl.get('coef', np.nan),
-            'replicated_se': repl.get('se', np.nan),
-            'replicated_n_obs': repl.get('n_obs', np.nan),
-            'replicated_counties': repl.get('n_counties', np.nan),
-            'difference': repl.get('coef', np.nan) - orig['coef'] if repl else np.nan
-        })
-
-    results_df = pd.DataFrame(rows)
-    results_df.to_csv('output/tables/replication_comparison.csv', index=False)
+    keys = sorted(all_original.keys())
+    repl = [all_results.get(key, {}) for key in keys]
+    original_coef = np.array([all_original[key]['coef'] for key in keys])
+    replicated_coef = np.array([r.get('coef', np.nan) for r in repl], dtype=float)
+    write_csv({
+        'specification': keys,
+        'original_coef': original_coef,
+        'original_se': np.array([all_original[key]['se'] for key in keys]),
+        'original_counties': [all_original[key].get('n_counties') for key in keys],
+        'replicated_coef': replicated_coef,
+        'replicated_se': np.array([r.get('se', np.nan) for r in repl], dtype=float),
+        'replicated_n_obs': [r.get('n_obs') for r in repl],
+        'replicated_counties': [r.get('n_counties') for r in repl],
+        'difference': replicated_coef - original_coef,
+    }, 'output/tables/replication_comparison.csv')
     print("Saved to output/tables/replication_comparison.csv")
 
     # Also save formatted tables
-    # Table 2 formatted
-    table2_formatted = []
-    for outcome in ['dem_turnout', 'dem_voteshare']:
-        row = {'outcome': outcome}
-        for col in [1, 2, 3] if outcome == 'dem_turnout' else [4, 5, 6]:
-            key = f'{outcome}_col{col}'
-            if key in all_results:
-                row[f'col{col}_coef'] = all_results[key]['coef']
-                row[f'col{col}_se'] = all_results[key]['se']
-        table2_formatted.append(row)
-
-    pd.DataFrame(table2_formatted).to_csv('output/tables/table2_replication.csv', index=False)
-
-    # Table 3 formatted
-    table3_formatted = []
-    for outcome in ['turnout', 'vbm']:
-        row = {'outcome': outcome}
-        for col in [1, 2, 3] if outcome == 'turnout' else [4, 5, 6]:
-            key = f'{outcome}_col{col}'
-            if key in all_results:
-                row[f'col{col}_coef'] = all_results[key]['coef']
-                row[f'col{col}_se'] = all_results[key]['se']
-        table3_formatted.append(row)
-
-    pd.DataFrame(table3_formatted).to_csv('output/tables/table3_replication.csv', index=False)
+    for outcomes, path in [
+        ({'dem_turnout': [1, 2, 3], 'dem_voteshare': [4, 5, 6]}, 'output/tables/table2_replication.csv'),
+        ({'turnout': [1, 2, 3], 'vbm': [4, 5, 6]}, 'output/tables/table3_replication.csv'),
+    ]:
+        columns = {'outcome': list(outcomes)}
+        for col in range(1, 7):
+            cells = [all_results.get(f'{outcome}_col{col}') if col in cols else None
+                     for outcome, cols in outcomes.items()]
+            if any(cells):
+                columns[f'col{col}_coef'] = [c['coef'] if c else None for c in cells]
+                columns[f'col{col}_se'] = [c['se'] if c else None for c in cells]
+        write_csv(columns, path)
+
     print("Saved table2_replication.csv and table3_replication.csv")
 
     print("\nReplication complete!")
@@ -5,10 +5,37 @@ Prepare the extension panel dataset for DiD analysis of VBM effects.
 Mirrors the data structure from the original Thompson et al. (2020) replication.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import os
 
+# treat_year sentinel for counties that never adopted (as in the VCA file)
+NEVER_TREATED = 9999
+
+
+def factorize_pair(left, right):
+    """
+    Factorize two key columns jointly, in sorted (left, right) order.
+
+    Works on integer codes rather than concatenated strings; the
+    'left_right' labels are only built once per unique pair and returned
+    as a Categorical aligned with the codes.
+    """
+    left_codes, left_uniques = pd.factorize(left, sort=True)
+    right_codes, right_uniques = pd.factorize(right, sort=True)
+    n_right = len(right_uniques)
+    codes, keys = pd.factorize(left_codes * n_right + right_codes, sort=True)
+    labels = (left_uniques[keys // n_right].astype(str) + '_'
+              + right_uniques[keys % n_right].astype(str))
+    return codes, pd.Categorical.from_codes(codes, labels)
+
+
+parser = argparse.ArgumentParser(description="Prepare the extension panel dataset")
+parser.add_argument('--csv', action='store_true',
+                    help="also export the panels as CSV alongside the Parquet files")
+args = parser.parse_args()
+
 # =============================================================================
 # LOAD DATA
 # =============================================================================
@@ -40,36 +67,24 @@ print("-"*70)
 # For California: treatment = VCA adoption
 # For Utah and Washington: always treated (100% VBM)
 
-# Create treatment timing for all states
-treatment_timing = []
+# Create treatment timing for all states, one frame per state
 
-# California VCA adoption
-for _, row in ca_vca.iterrows():
-    treatment_timing.append({
-        'county': row['county'],
-        'state': 'CA',
-        'treat_year': row['vca_first_year'] if row['vca_first_year'] != 9999 else np.inf
-    })
+# California VCA adoption (9999 = never adopted)
+ca_timing = pd.DataFrame({
+    'county': ca_vca['county'].to_numpy(),
+    'state': 'CA',
+    'treat_year': ca_vca['vca_first_year'].to_numpy()
+})
 
 # Utah: 100% VBM since 2019
-utah_counties = election_data[election_data['state'] == 'UT']['county'].unique()
-for county in utah_counties:
-    treatment_timing.append({
-        'county': county,
-        'state': 'UT',
-        'treat_year': 2019  # Utah adopted universal VBM in 2019
-    })
+utah_counties = election_data.loc[election_data['state'] == 'UT', 'county'].unique()
+ut_timing = pd.DataFrame({'county': utah_counties, 'state': 'UT', 'treat_year': 2019})
 
 # Washington: 100% VBM since 2011
-wa_counties = election_data[election_data['state'] == 'WA']['county'].unique()
-for county in wa_counties:
-    treatment_timing.append({
-        'county': county,
-        'state': 'WA',
-        'treat_year': 2011  # Washington adopted universal VBM in 2011
-    })
-
-treatment_df = pd.DataFrame(treatment_timing)
+wa_counties = election_data.loc[election_data['state'] == 'WA', 'county'].unique()
+wa_timing = pd.DataFrame({'county': wa_counties, 'state': 'WA', 'treat_year': 2011})
+
+treatment_df = pd.concat([ca_timing, ut_timing, wa_timing], ignore_index=True)
 print(f"Treatment timing created for {len(treatment_df)} counties")
 
 # =============================================================================
@@ -80,23 +95,30 @@ print("\n" + "-"*70)
 print("Merging datasets...")
 print("-"*70)
 
-# Merge election data with treatment timing
-panel = election_data.merge(treatment_df, on=['county', 'state'], how='left')
+# Attach treatment timing (one row per county) with a keyed lookup
+panel = election_data
+treat_lookup = treatment_df.set_index(['state', 'county'])['treat_year']
+panel['treat_year'] = (
+    pd.MultiIndex.from_arrays([panel['state'], panel['county']]).map(treat_lookup)
+    .fillna(NEVER_TREATED).astype(np.int16)
+)
 print(f"After treatment merge: {len(panel)} observations")
 
 # Merge with CVAP data
-# First, reshape CVAP to long format
-cvap_long = pd.melt(
-    cvap_data,
-    id_vars=['county', 'state'],
-    value_vars=['cvap_2020', 'cvap_2022', 'cvap_2024'],
-    var_name='year_var',
-    value_name='cvap'
-)
-cvap_long['year'] = cvap_long['year_var'].str.extract(r'(\d{4})').astype(int)
-cvap_long = cvap_long.drop(columns=['year_var'])
-
-panel = panel.merge(cvap_long, on=['county', 'state', 'year'], how='left')
+# First, reshape CVAP to long format: one block of rows per year
+cvap_years = [2020, 2022, 2024]
+n_cvap = len(cvap_data)
+cvap_long = pd.DataFrame({
+    'county': np.tile(cvap_data['county'].to_numpy(), len(cvap_years)),
+    'state': np.tile(cvap_data['state'].to_numpy(), len(cvap_years)),
+    'cvap': np.concatenate([cvap_data[f'cvap_{year}'].to_numpy() for year in cvap_years]),
+    'year': np.repeat(cvap_years, n_cvap),
+})
+
+cvap_lookup = cvap_long.set_index(['state', 'county', 'year'])['cvap']
+panel['cvap'] = pd.MultiIndex.from_arrays(
+    [panel['state'], panel['county'], panel['year']]
+).map(cvap_lookup)
 print(f"After CVAP merge: {len(panel)} observations")
 
 # Check for missing CVAP
@@ -113,35 +135,38 @@ print("Creating analysis variables...")
 print("-"*70)
 
 # Treatment indicator: treat = 1 if VBM adopted by election year
-panel['treat'] = (panel['year'] >= panel['treat_year']).astype(int)
+panel['treat'] = (
+    panel['year'].to_numpy(dtype=np.int16) >= panel['treat_year'].to_numpy()
+).astype(np.int8)
 
-# Vote share variables
-panel['dem_share'] = panel['dem_votes'] / (panel['dem_votes'] + panel['rep_votes'])
-panel['rep_share'] = panel['rep_votes'] / (panel['dem_votes'] + panel['rep_votes'])
+# Vote share variables (two-party denominator computed once)
+dem_votes = panel['dem_votes'].to_numpy(dtype=float)
+rep_votes = panel['rep_votes'].to_numpy(dtype=float)
+two_party = dem_votes + rep_votes
+panel['dem_share'] = dem_votes / two_party
+panel['rep_share'] = rep_votes / two_party
 
 # Turnout (using CVAP as denominator)
-panel['turnout'] = panel['total_votes'] / panel['cvap']
+cvap = panel['cvap'].to_numpy(dtype=float)
+panel['turnout'] = panel['total_votes'].to_numpy(dtype=float) / cvap
 
 # Log variables (following original paper)
-panel['log_cvap'] = np.log(panel['cvap'])
+panel['log_cvap'] = np.log(cvap)
 
-# Create county identifier for fixed effects
-panel['county_id'] = panel['state'] + '_' + panel['county']
+# County and state-year identifiers for fixed effects, with numeric indices
+# for panel estimation (same ordering as sorting the string identifiers)
+panel['county_idx'], panel['county_id'] = factorize_pair(panel['state'], panel['county'])
+panel['state_year_idx'], panel['state_year'] = factorize_pair(panel['state'], panel['year'])
 
-# Create state-year identifier for fixed effects
-panel['state_year'] = panel['state'] + '_' + panel['year'].astype(str)
+# Year and state indicators, built as one-hot int8 blocks from a single
+# array per column and attached in one assignment each
+years = np.array([2020, 2022, 2024])
+year_onehot = (panel['year'].to_numpy()[:, None] == years).astype(np.int8)
+panel[[f'year_{year}' for year in years]] = year_onehot
 
-# Create numeric indices for panel estimation
-panel['county_idx'] = pd.Categorical(panel['county_id']).codes
-panel['state_year_idx'] = pd.Categorical(panel['state_year']).codes
-
-# Year indicators
-for year in [2020, 2022, 2024]:
-    panel[f'year_{year}'] = (panel['year'] == year).astype(int)
-
-# State indicators
-for state in ['CA', 'UT', 'WA']:
-    panel[f'state_{state}'] = (panel['state'] == state).astype(int)
+states = np.array(['CA', 'UT', 'WA'], dtype=object)
+state_onehot = (panel['state'].to_numpy()[:, None] == states).astype(np.int8)
+panel[[f'state_{state}' for state in states]] = state_onehot
 
 print("Variables created:")
 print(f"  - treat: Treatment indicator (VBM adopted)")
@@ -164,13 +189,10 @@ treat_summary = panel.groupby(['state', 'year'])['treat'].agg(['sum', 'count'])
 treat_summary['pct_treated'] = (treat_summary['sum'] / treat_summary['count'] * 100).round(1)
 print(treat_summary)
 
-# California-specific: variation in treatment
-ca_panel = panel[panel['state'] == 'CA']
+# California-specific: variation in treatment (read off the summary above)
 print("\nCalifornia treatment variation:")
-for year in sorted(ca_panel['year'].unique()):
-    year_data = ca_panel[ca_panel['year'] == year]
-    n_treated = year_data['treat'].sum()
-    n_total = len(year_data)
+ca_summary = treat_summary.loc['CA'] if 'CA' in treat_summary.index else treat_summary.iloc[:0]
+for year, (n_treated, n_total) in ca_summary[['sum', 'count']].iterrows():
     print(f"  {year}: {n_treated}/{n_total} counties treated ({n_treated/n_total*100:.1f}%)")
 
 # =============================================================================
@@ -201,7 +223,7 @@ print(f"  Mean: {panel['dem_share'].mean():.3f}")
 
 # Check balance
 print("\nPanel balance check:")
-obs_per_county = panel.groupby('county_id').size()
+obs_per_county = np.bincount(panel['county_idx'])
 print(f"  Observations per county: min={obs_per_county.min()}, max={obs_per_county.max()}")
 if obs_per_county.min() != obs_per_county.max():
     print("  WARNING: Unbalanced panel")
@@ -229,14 +251,26 @@ analysis_cols = [
     'state_CA', 'state_UT', 'state_WA'
 ]
 
-panel_out = panel[analysis_cols].copy()
-panel_out.to_csv('data/extension/extension_panel.csv', index=False)
-print(f"Saved: data/extension/extension_panel.csv ({len(panel_out)} observations)")
+# Column selection and the CA filter are written out directly; neither
+# needs its own defensive .copy(). county and state are stored as
+# Categoricals (sorted categories, kept by Parquet) so consumers can read
+# their distinct values off .cat.categories instead of re-deriving them.
+panel_out = panel[analysis_cols].astype({'county': 'category', 'state': 'category'})
+panel_out.to_parquet('data/extension/extension_panel.parquet', index=False,
+                     engine='pyarrow', compression='zstd')
+print(f"Saved: data/extension/extension_panel.parquet ({len(panel_out)} observations)")
 
 # Also save California-only panel for focused analysis
-ca_panel_out = panel_out[panel_out['state'] == 'CA'].copy()
-ca_panel_out.to_csv('data/extension/california_panel.csv', index=False)
-print(f"Saved: data/extension/california_panel.csv ({len(ca_panel_out)} observations)")
+ca_panel_out = panel_out[panel_out['state'].to_numpy() == 'CA']
+ca_panel_out.to_parquet('data/extension/california_panel.parquet', index=False,
+                        engine='pyarrow', compression='zstd')
+print(f"Saved: data/extension/california_panel.parquet ({len(ca_panel_out)} observations)")
+
+# Optional CSV export for tools that cannot read Parquet
+if args.csv:
+    panel_out.to_csv('data/extension/extension_panel.csv', index=False)
+    ca_panel_out.to_csv('data/extension/california_panel.csv', index=False)
+    print("Saved: data/extension/extension_panel.csv, data/extension/california_panel.csv")
 
 # =============================================================================
 # SUMMARY STATISTICS
@@ -249,8 +283,8 @@ print("="*70)
 print("\nPanel dimensions:")
 print(f"  Total observations: {len(panel_out)}")
 print(f"  Counties: {panel_out['county_id'].nunique()}")
-print(f"  Years: {sorted(panel_out['year'].unique())}")
-print(f"  States: {sorted(panel_out['state'].unique())}")
+print(f"  Years: {np.unique(panel_out['year']).tolist()}")
+print(f"  States: {panel_out['state'].cat.categories.tolist()}")
 
 print("\nKey variables (mean by treatment status):")
 for var in ['dem_share', 'turnout']:
@@ -262,7 +296,7 @@ for var in ['dem_share', 'turnout']:
     print(f"    Difference: {treated - control:.4f}")
 
 print("\nKey variables (mean by state):")
-state_means = panel_out.groupby('state')[['dem_share', 'turnout', 'treat']].mean()
+state_means = panel_out.groupby('state', observed=True)[['dem_share', 'turnout', 'treat']].mean()
 print(state_means.round(4))
 
 print("\n" + "="*70)
@@ -7,107 +7,225 @@ Applies the same DiD methodology from Thompson et al. (2020) to new data.
 
 import pandas as pd
 import numpy as np
-from linearmodels.panel import PanelOLS
-import statsmodels.api as sm
+from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
+# treat_year sentinel for counties that never adopted VBM/VCA
+NEVER_TREATED = 9999
+
+# Election years covered by the extension panel
+EXTENSION_YEARS = np.array([2020, 2022, 2024])
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 # =============================================================================
 # LOAD DATA
 # =============================================================================
 
+# Columns used by the analyses below; the rest of the panel is not read
+ANALYSIS_COLS = [
+    'county_id', 'state', 'year',
+    'treat', 'treat_year',
+    'dem_share', 'turnout',
+    'county_idx', 'state_year_idx',
+]
+
+
+def add_year_idx(df):
+    """Add the year fixed-effect index (position in EXTENSION_YEARS)."""
+    df['year_idx'] = np.searchsorted(EXTENSION_YEARS, df['year'].to_numpy()).astype(np.int8)
+    return df
+
+
 def load_extension_data():
     """Load the extension panel dataset."""
-    df = pd.read_csv('data/extension/extension_panel.csv')
-    return df
+    df = pd.read_parquet('data/extension/extension_panel.parquet', columns=ANALYSIS_COLS)
+    return add_year_idx(df)
 
 
 def load_california_data():
     """Load California-only panel for focused DiD analysis."""
-    df = pd.read_csv('data/extension/california_panel.csv')
-    return df
+    df = pd.read_parquet('data/extension/california_panel.parquet', columns=ANALYSIS_COLS)
+    return add_year_idx(df)
 
 
 # =============================================================================
 # REGRESSION FUNCTIONS
 # =============================================================================
 
-def run_twfe_regression(df, y_var, x_var='treat', sample_filter=None,
-                        entity_var='county_idx', time_var='state_year_idx',
-                        cluster_var='county_idx'):
+def prepare_panel(df, entity_var='county_idx', time_var='state_year_idx'):
     """
-    Run two-way fixed effects panel regression.
+    Index a panel by (entity, time) once so several regressions can share it.
 
     Parameters:
     -----------
     df : DataFrame
-    y_var : str - outcome variable
-    x_var : str - treatment variable (default 'treat')
-    sample_filter : Series of bool or None - rows to include
-    entity_var : str - entity (county) identifier
+    entity_var : str - entity (county) identifier, also the cluster variable
     time_var : str - time identifier
-    cluster_var : str - variable to cluster on
 
     Returns:
     --------
-    dict with coef, se, n_obs, n_entities
+    DataFrame with an (entity, time) MultiIndex
     """
+    index = pd.MultiIndex.from_arrays(
+        [df[entity_var].to_numpy(dtype=int), df[time_var].to_numpy(dtype=int)],
+        names=['entity', 'time']
+    )
+    return df.set_axis(index)
+
+
+def _group_demean(v, codes, n_groups):
+    """Subtract group means (by integer codes) from each column of v."""
+    counts = np.maximum(np.bincount(codes, minlength=n_groups), 1)
+    means = np.column_stack([
+        np.bincount(codes, weights=col, minlength=n_groups) for col in v.T
+    ]) / counts[:, None]
+    return v - means[codes]
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _group_demean(v, codes, n_groups):
+        """Subtract group means (by integer codes) from each column of v."""
+        n, k = v.shape
+        means = np.zeros((n_groups, k))
+        counts = np.zeros(n_groups)
+        for i in range(n):
+            g = codes[i]
+            counts[g] += 1
+            for j in range(k):
+                means[g, j] += v[i, j]
+        for g in range(n_groups):
+            if counts[g] > 0:
+                for j in range(k):
+                    means[g, j] /= counts[g]
+        out = np.empty((n, k))
+        for i in prange(n):
+            g = codes[i]
+            for j in range(k):
+                out[i, j] = v[i, j] - means[g, j]
+        return out
+
+
+def twfe_demean(v, entity_codes, time_codes, tol=1e-10, max_iter=1000):
+    """
+    Two-way within transformation by alternating projections.
+
+    Demeans the columns of v by entity and then by time until the time
+    step no longer moves the data; one pass is exact on balanced panels.
+
+    Returns:
+    --------
+    (demeaned array, converged flag)
+    """
+    n_entities = entity_codes.max() + 1
+    n_times = time_codes.max() + 1
+    for _ in range(max_iter):
+        v = _group_demean(v, entity_codes, n_entities)
+        v_new = _group_demean(v, time_codes, n_times)
+        if np.max(np.abs(v_new - v)) < tol:
+            return v_new, True
+        v = v_new
+    return v, False
+
+
+def run_twfe_regressions(panel, y_vars, x_var='treat', sample_filter=None):
+    """
+    Run two-way fixed effects panel regressions of several outcomes on one
+    treatment variable, clustered by entity.
+
+    With a single regressor the TWFE estimate is OLS of the within-
+    transformed outcome on the within-transformed treatment, so it is
+    computed in closed form. Outcomes with the same missing-data pattern
+    share one sample, so their columns and x are demeaned together in one
+    pass. The standard error is the entity-clustered sandwich scaled by
+    N/(N - G - T), with a t(N - G - T) p-value, which is what PanelOLS'
+    clustered covariance reports with its defaults (absorbed effects
+    counted, debiased=True).
+
+    Parameters:
+    -----------
+    panel : DataFrame - indexed by prepare_panel()
+    y_vars : list of str - outcome variables
+    x_var : str - treatment variable (default 'treat')
+    sample_filter : array of bool or None - rows to include
 
-    # Apply sample filter
+    Returns:
+    --------
+    dict keyed by outcome of dicts with coef, se, pval, n_obs, n_entities,
+    n_periods (None where the regression could not be run)
+    """
+
+    # Select needed columns and apply sample filter
+    data = panel[list(y_vars) + [x_var]]
     if sample_filter is not None:
-        sample = df[sample_filter].copy()
-    else:
-        sample = df.copy()
-
-    # Select needed columns and drop missing
-    cols_needed = list(set([y_var, x_var, entity_var, time_var, cluster_var]))
-    sample = sample[cols_needed].dropna().copy()
-
-    if len(sample) == 0:
-        return None
-
-    # Ensure numeric types
-    sample[y_var] = sample[y_var].astype(float)
-    sample[x_var] = sample[x_var].astype(float)
-    sample[entity_var] = sample[entity_var].astype(int)
-    sample[time_var] = sample[time_var].astype(int)
-
-    # Set up panel index
-    sample = sample.reset_index(drop=True)
-    entity_vals = sample[entity_var].values.copy()
-    time_vals = sample[time_var].values.copy()
-    sample = sample.set_index([pd.Index(entity_vals, name='entity'), pd.Index(time_vals, name='time')])
-
-    # Prepare exogenous variables with constant
-    exog = sm.add_constant(sample[[x_var]])
-
-    # Run PanelOLS with entity and time effects
-    try:
-        model = PanelOLS(
-            dependent=sample[y_var],
-            exog=exog,
-            entity_effects=True,
-            time_effects=True,
-            drop_absorbed=True
-        )
-        results = model.fit(cov_type='clustered', cluster_entity=True)
-
-        coef = results.params[x_var]
-        se = results.std_errors[x_var]
-        pval = results.pvalues[x_var]
-
-    except Exception as e:
-        print(f"  Warning: PanelOLS failed ({e})")
-        return None
+        data = data[np.asarray(sample_filter, dtype=bool)]
+    values = data.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    entity_all, time_all = (np.asarray(codes) for codes in data.index.codes)
 
-    return {
-        'coef': coef,
-        'se': se,
-        'pval': pval,
-        'n_obs': int(results.nobs),
-        'n_entities': sample.index.get_level_values('entity').nunique(),
-        'n_periods': sample.index.get_level_values('time').nunique()
-    }
+    # Group outcomes by the rows they keep after dropping missing values
+    samples = {}
+    for j in range(len(y_vars)):
+        rows = valid[:, j] & valid[:, -1]
+        samples.setdefault(rows.tobytes(), (rows, []))[1].append(j)
+
+    results = {}
+    for rows, cols in samples.values():
+        if not rows.any():
+            results.update({y_vars[j]: None for j in cols})
+            continue
+
+        entity_codes = entity_all[rows]
+        time_codes = time_all[rows]
+
+        # Within transformation of [y_1, ..., y_k, x]
+        yx, converged = twfe_demean(values[rows][:, cols + [-1]], entity_codes, time_codes)
+        if not converged:
+            print("  Warning: within transformation did not converge")
+        x = yx[:, -1]
+
+        xx = x @ x
+        if xx < 1e-12:
+            print(f"  Warning: {x_var} is absorbed by the fixed effects")
+            results.update({y_vars[j]: None for j in cols})
+            continue
+
+        n_obs = len(x)
+        n_entities = np.count_nonzero(np.bincount(entity_codes))
+        n_periods = np.count_nonzero(np.bincount(time_codes))
+        df_resid = n_obs - n_entities - n_periods
+
+        for k, j in enumerate(cols):
+            y = yx[:, k]
+            coef = (x @ y) / xx
+            resid = y - coef * x
+
+            # Entity-clustered sandwich: sum over clusters of the squared score
+            score = np.bincount(entity_codes, weights=x * resid)
+            se = np.sqrt(n_obs / df_resid * (score @ score)) / xx
+            pval = 2 * stats.t.sf(abs(coef / se), df_resid)
+
+            results[y_vars[j]] = {
+                'coef': coef,
+                'se': se,
+                'pval': pval,
+                'n_obs': n_obs,
+                'n_entities': n_entities,
+                'n_periods': n_periods
+            }
+
+    return results
+
+
+def run_twfe_regression(panel, y_var, x_var='treat', sample_filter=None):
+    """Run a single TWFE regression; see run_twfe_regressions()."""
+    return run_twfe_regressions(panel, [y_var], x_var, sample_filter)[y_var]
 
 
 def run_simple_did(df, y_var, treated_group, control_group, pre_period, post_period):
@@ -133,11 +251,18 @@ def run_simple_did(df, y_var, treated_group, control_group, pre_period, post_per
     if isinstance(post_period, int):
         post_period = [post_period]
 
-    # Calculate means
-    treated_pre = df.loc[treated_group & df['year'].isin(pre_period), y_var].mean()
-    treated_post = df.loc[treated_group & df['year'].isin(post_period), y_var].mean()
-    control_pre = df.loc[control_group & df['year'].isin(pre_period), y_var].mean()
-    control_post = df.loc[control_group & df['year'].isin(post_period), y_var].mean()
+    # Calculate the four cell means in one grouped pass:
+    # group 1 = treated, 0 = control; period 0 = pre, 1 = post
+    group = np.where(treated_group, 1, np.where(control_group, 0, -1))
+    period = np.where(df['year'].isin(pre_period), 0,
+                      np.where(df['year'].isin(post_period), 1, -1))
+    keep = (group >= 0) & (period >= 0)
+    means = pd.Series(df[y_var].to_numpy()[keep]).groupby([group[keep], period[keep]]).mean()
+
+    treated_pre = means.get((1, 0), np.nan)
+    treated_post = means.get((1, 1), np.nan)
+    control_pre = means.get((0, 0), np.nan)
+    control_post = means.get((0, 1), np.nan)
 
     # DiD estimate
     did = (treated_post - treated_pre) - (control_post - control_pre)
@@ -169,17 +294,13 @@ def analyze_all_states(df):
 
     results = {}
 
-    # Create year-level time variable (not state-year) for cross-state comparison
-    df['year_idx'] = pd.Categorical(df['year']).codes
+    # Year-level time variable (not state-year) for cross-state comparison
+    panel = prepare_panel(df, time_var='year_idx')
+    fits = run_twfe_regressions(panel, ['dem_share', 'turnout'])
 
     # ----- DEMOCRATIC VOTE SHARE -----
     print("\n--- Democratic Vote Share ---")
-    res = run_twfe_regression(
-        df=df,
-        y_var='dem_share',
-        x_var='treat',
-        time_var='year_idx'  # Use year FE, not state-year
-    )
+    res = fits['dem_share']
     if res:
         results['dem_share_all'] = res
         stars = '***' if res['pval'] < 0.01 else ('**' if res['pval'] < 0.05 else ('*' if res['pval'] < 0.10 else ''))
@@ -188,12 +309,7 @@ def analyze_all_states(df):
 
     # ----- TURNOUT -----
     print("\n--- Turnout ---")
-    res = run_twfe_regression(
-        df=df,
-        y_var='turnout',
-        x_var='treat',
-        time_var='year_idx'
-    )
+    res = fits['turnout']
     if res:
         results['turnout_all'] = res
         stars = '***' if res['pval'] < 0.01 else ('**' if res['pval'] < 0.05 else ('*' if res['pval'] < 0.10 else ''))
@@ -207,9 +323,9 @@ def analyze_all_states(df):
 # EXTENSION ANALYSIS: CALIFORNIA ONLY
 # =============================================================================
 
-def analyze_california(df):
+def analyze_california(ca):
     """
-    Run focused DiD analysis on California.
+    Run focused DiD analysis on California (panel from load_california_data()).
     Uses VCA adoption (staggered treatment) with never-VCA counties as controls.
     """
 
@@ -217,24 +333,16 @@ def analyze_california(df):
     print("EXTENSION ANALYSIS: CALIFORNIA ONLY (VCA DiD)")
     print("="*70)
 
-    # Filter to California
-    ca = df[df['state'] == 'CA'].copy()
-
-    # Create year fixed effect index
-    ca['year_idx'] = pd.Categorical(ca['year']).codes
+    panel = prepare_panel(ca, time_var='year_idx')
 
     results = {}
 
+    # Two-way FE: county + year, both outcomes in one pass
+    fits = run_twfe_regressions(panel, ['dem_share', 'turnout'])
+
     # ----- DEMOCRATIC VOTE SHARE -----
     print("\n--- Democratic Vote Share ---")
-
-    # Two-way FE: county + year
-    res = run_twfe_regression(
-        df=ca,
-        y_var='dem_share',
-        x_var='treat',
-        time_var='year_idx'
-    )
+    res = fits['dem_share']
     if res:
         results['dem_share_ca'] = res
         stars = '***' if res['pval'] < 0.01 else ('**' if res['pval'] < 0.05 else ('*' if res['pval'] < 0.10 else ''))
@@ -243,13 +351,7 @@ def analyze_california(df):
 
     # ----- TURNOUT -----
     print("\n--- Turnout ---")
-
-    res = run_twfe_regression(
-        df=ca,
-        y_var='turnout',
-        x_var='treat',
-        time_var='year_idx'
-    )
+    res = fits['turnout']
     if res:
         results['turnout_ca'] = res
         stars = '***' if res['pval'] < 0.01 else ('**' if res['pval'] < 0.05 else ('*' if res['pval'] < 0.10 else ''))
@@ -259,15 +361,22 @@ def analyze_california(df):
     # ----- TREATMENT COHORT ANALYSIS -----
     print("\n--- Treatment by Cohort ---")
 
-    # Identify treatment cohorts
-    ca['cohort'] = ca['treat_year'].replace({np.inf: 'Never', 2018: '2018', 2020: '2020', 2022: '2022'})
+    # Identify treatment cohorts: adoption year, or 'Never' for NEVER_TREATED
+    treat_year = ca['treat_year'].to_numpy()
+    adopted = treat_year != NEVER_TREATED
+    cohort_years, cohort_codes = np.unique(treat_year[adopted], return_inverse=True)
+    codes = np.full(len(treat_year), len(cohort_years))
+    codes[adopted] = cohort_codes
+    ca['cohort'] = pd.Categorical.from_codes(
+        codes, [str(int(year)) for year in cohort_years] + ['Never']
+    )
     print("\nCohort distribution:")
-    print(ca.groupby(['cohort', 'year']).size().unstack())
+    print(ca.groupby(['cohort', 'year'], observed=True).size().unstack())
 
     print("\nMean outcomes by cohort and year:")
     for var in ['dem_share', 'turnout']:
         print(f"\n{var}:")
-        means = ca.groupby(['cohort', 'year'])[var].mean().unstack()
+        means = ca.groupby(['cohort', 'year'], observed=True)[var].mean().unstack()
         print(means.round(4))
 
     return results
@@ -351,34 +460,35 @@ def print_descriptive_stats(df):
     print("\n--- Panel Structure ---")
     print(f"Total observations: {len(df)}")
     print(f"Counties: {df['county_id'].nunique()}")
-    print(f"Time periods: {sorted(df['year'].unique())}")
-    print(f"States: {sorted(df['state'].unique())}")
+    years = np.unique(df['year']).tolist()
+    print(f"Time periods: {years}")
+    print(f"States: {df['state'].cat.categories.tolist()}")
 
     print("\n--- Treatment Status by State and Year ---")
+    treat_counts = df.groupby(['state', 'year'], observed=True)['treat'].agg(['sum', 'size'])
+    treat_counts = treat_counts.reindex(
+        pd.MultiIndex.from_product([['CA', 'UT', 'WA'], years]), fill_value=0
+    )
     for state in ['CA', 'UT', 'WA']:
-        state_df = df[df['state'] == state]
         print(f"\n{state}:")
-        for year in sorted(df['year'].unique()):
-            year_df = state_df[state_df['year'] == year]
-            n_treated = year_df['treat'].sum()
-            n_total = len(year_df)
+        for year, (n_treated, n_total) in treat_counts.loc[state].iterrows():
             pct = n_treated / n_total * 100 if n_total > 0 else 0
             print(f"  {year}: {n_treated}/{n_total} treated ({pct:.1f}%)")
 
     print("\n--- Outcome Variables (Mean by Year) ---")
-    yearly_means = df.groupby('year')[['dem_share', 'turnout']].mean()
+    yearly_means = df.groupby('year', observed=True)[['dem_share', 'turnout']].mean()
     print(yearly_means.round(4))
 
     print("\n--- Outcome Variables (Mean by State) ---")
-    state_means = df.groupby('state')[['dem_share', 'turnout', 'treat']].mean()
+    state_means = df.groupby('state', observed=True)[['dem_share', 'turnout', 'treat']].mean()
     print(state_means.round(4))
 
     print("\n--- California: Mean by Treatment Status and Year ---")
     ca = df[df['state'] == 'CA']
     print("\nDemocratic Vote Share:")
-    print(ca.groupby(['treat', 'year'])['dem_share'].mean().unstack().round(4))
+    print(ca.groupby(['treat', 'year'], observed=True)['dem_share'].mean().unstack().round(4))
     print("\nTurnout:")
-    print(ca.groupby(['treat', 'year'])['turnout'].mean().unstack().round(4))
+    print(ca.groupby(['treat', 'year'], observed=True)['turnout'].mean().unstack().round(4))
 
 
 # =============================================================================
@@ -404,7 +514,7 @@ if __name__ == "__main__":
     all_results = {}
 
     # California-only analysis (main specification)
-    ca_results = analyze_california(df)
+    ca_results = analyze_california(load_california_data())
     all_results.update(ca_results)
 
     # All-states analysis (supplementary)
@@ -13,7 +13,7 @@ Usage:
     python code/00_run_all.py
 
 Requirements:
-    - Python 3.8+
+    - Python 3.10+
     - pandas, numpy, pyfixest, statsmodels
     - Original data in original/data/modified/analysis.dta
 """
@@ -29,7 +29,7 @@ CODE_DIR = PROJECT_DIR / "code"
 
 
 def run_script(script_name, description):
-    """Run a Python script and capture output."""
+    """Run a Python script, streaming its output as it runs."""
     script_path = CODE_DIR / script_name
 
     print("\n" + "=" * 70)
@@ -37,23 +37,18 @@ def run_script(script_name, description):
     print(f"Script: {script_name}")
     print("=" * 70 + "\n")
 
-    start_time = time.time()
+    # Flush our own buffered output so it appears before the child's
+    sys.stdout.flush()
 
+    start_time = time.perf_counter()
+
+    # The child inherits stdout/stderr, so its output is not buffered here
     result = subprocess.run(
         [sys.executable, str(script_path)],
-        cwd=str(PROJECT_DIR),
-        capture_output=True,
-        text=True
+        cwd=str(PROJECT_DIR)
     )
 
-    elapsed = time.time() - start_time
-
-    # Print output
-    if result.stdout:
-        print(result.stdout)
-
-    if result.stderr:
-        print("STDERR:", result.stderr)
+    elapsed = time.perf_counter() - start_time
 
     if result.returncode != 0:
         print(f"\n*** ERROR: {script_name} failed with return code {result.returncode} ***")
@@ -9,144 +9,234 @@ This script:
 3. Validates the original data files
 4. Creates necessary output directories
 
+Each check's report is buffered and written in one piece. A successful run
+records a stat signature of the checked paths in output/.setup_cache.json;
+later runs skip the checks while it still matches.
+
 Usage:
     python code/01_setup.py
 """
 
+import json
+import os
 import sys
+from importlib.util import find_spec
 from pathlib import Path
 
 # Set project directory
 PROJECT_DIR = Path(__file__).parent.parent
+CACHE_FILE = PROJECT_DIR / "output" / ".setup_cache.json"
+
+REQUIRED_DIRS = [
+    "code",
+    "data",
+    "data/extension",
+    "data/combined",
+    "original",
+    "original/data/modified",
+    "output",
+    "output/tables",
+    "output/figures",
+    "notes",
+    "paper",
+]
+
+PACKAGES = {
+    "pandas": "Data manipulation",
+    "numpy": "Numerical operations",
+    "statsmodels": "Statistical models",
+}
+
+OPTIONAL_PACKAGES = {
+    "pyfixest": "Fixed effects regression (optional, recommended)",
+}
+
+REQUIRED_FILES = [
+    "original/data/modified/analysis.dta",
+]
+
+EXTENSION_FILES = [
+    ("data/extension/california_vca_adoption.csv", True),
+    ("data/extension/three_states_2020_pres.csv", True),
+    ("data/extension/treatment_extension.csv", True),
+    ("data/extension/three_states_2022_gov.csv", False),  # Optional
+    ("data/extension/three_states_2024_pres.csv", False),  # Optional
+]
+
+
+def scan_paths(rel_paths):
+    """
+    Look up project-relative paths with one os.scandir per parent directory.
+
+    Returns {rel_path: os.DirEntry, or None if missing}. DirEntry.stat() is
+    cached, so sizes can be read without another stat call.
+    """
+    listings = {}
+    found = {}
+    for rel in rel_paths:
+        parent, name = os.path.split(rel)
+        if parent not in listings:
+            try:
+                with os.scandir(PROJECT_DIR / parent) as it:
+                    listings[parent] = {e.name: e for e in it}
+            except (FileNotFoundError, NotADirectoryError):
+                listings[parent] = {}
+        found[rel] = listings[parent].get(name)
+    return found
 
 
 def check_directory_structure():
     """Verify required directories exist."""
-    print("Checking directory structure...")
-
-    required_dirs = [
-        "code",
-        "data",
-        "data/extension",
-        "data/combined",
-        "original",
-        "original/data/modified",
-        "output",
-        "output/tables",
-        "output/figures",
-        "notes",
-        "paper",
-    ]
+    lines = []
+    say = lines.append
+    say("Checking directory structure...")
 
+    entries = scan_paths(REQUIRED_DIRS)
     missing = []
-    for d in required_dirs:
-        path = PROJECT_DIR / d
-        if not path.exists():
+    for d in REQUIRED_DIRS:
+        if entries[d] is None:
             missing.append(d)
-            path.mkdir(parents=True, exist_ok=True)
-            print(f"  Created: {d}")
+            (PROJECT_DIR / d).mkdir(parents=True, exist_ok=True)
+            say(f"  Created: {d}")
         else:
-            print(f"  ✓ {d}")
+            say(f"  ✓ {d}")
 
+    print("\n".join(lines))
     return len(missing) == 0
 
 
 def check_dependencies():
     """Check for required Python packages."""
-    print("\nChecking dependencies...")
-
-    packages = {
-        "pandas": "Data manipulation",
-        "numpy": "Numerical operations",
-        "statsmodels": "Statistical models",
-    }
-
-    optional_packages = {
-        "pyfixest": "Fixed effects regression (optional, recommended)",
-    }
+    lines = []
+    say = lines.append
+    say("\nChecking dependencies...")
 
     missing = []
 
-    for pkg, desc in packages.items():
+    for pkg, desc in PACKAGES.items():
         try:
-            __import__(pkg)
-            print(f"  ✓ {pkg}: {desc}")
+            # Locate the package without executing its top-level code
+            if find_spec(pkg) is None:
+                raise ImportError(pkg)
+            say(f"  ✓ {pkg}: {desc}")
         except ImportError:
-            print(f"  ✗ {pkg}: {desc} (MISSING)")
+            say(f"  ✗ {pkg}: {desc} (MISSING)")
             missing.append(pkg)
 
-    for pkg, desc in optional_packages.items():
+    for pkg, desc in OPTIONAL_PACKAGES.items():
         try:
-            __import__(pkg)
-            print(f"  ✓ {pkg}: {desc}")
+            if find_spec(pkg) is None:
+                raise ImportError(pkg)
+            say(f"  ✓ {pkg}: {desc}")
         except ImportError:
-            print(f"  ⚠ {pkg}: {desc} (optional, not installed)")
+            say(f"  ⚠ {pkg}: {desc} (optional, not installed)")
 
     if missing:
-        print(f"\nMissing required packages: {', '.join(missing)}")
-        print("Install with: pip install " + " ".join(missing))
+        say(f"\nMissing required packages: {', '.join(missing)}")
+        say("Install with: pip install " + " ".join(missing))
+        print("\n".join(lines))
         return False
 
+    print("\n".join(lines))
     return True
 
 
 def check_original_data():
     """Verify original data files exist."""
-    print("\nChecking original data...")
-
-    required_files = [
-        "original/data/modified/analysis.dta",
-    ]
+    lines = []
+    say = lines.append
+    say("\nChecking original data...")
 
+    entries = scan_paths(REQUIRED_FILES)
     all_found = True
-    for f in required_files:
-        path = PROJECT_DIR / f
-        if path.exists():
+    for f in REQUIRED_FILES:
+        entry = entries[f]
+        if entry is not None:
             # Get file size
-            size = path.stat().st_size
-            print(f"  ✓ {f} ({size:,} bytes)")
+            size = entry.stat().st_size
+            say(f"  ✓ {f} ({size:,} bytes)")
         else:
-            print(f"  ✗ {f} (MISSING)")
+            say(f"  ✗ {f} (MISSING)")
             all_found = False
 
     if not all_found:
-        print("\nOriginal data missing. Please ensure the original replication")
-        print("materials are placed in the 'original/' directory.")
+        say("\nOriginal data missing. Please ensure the original replication")
+        say("materials are placed in the 'original/' directory.")
 
+    print("\n".join(lines))
     return all_found
 
 
 def check_extension_data():
     """Check extension data files."""
-    print("\nChecking extension data...")
-
-    extension_files = [
-        ("data/extension/california_vca_adoption.csv", True),
-        ("data/extension/three_states_2020_pres.csv", True),
-        ("data/extension/treatment_extension.csv", True),
-        ("data/extension/three_states_2022_gov.csv", False),  # Optional
-        ("data/extension/three_states_2024_pres.csv", False),  # Optional
-    ]
-
-    for f, required in extension_files:
-        path = PROJECT_DIR / f
-        if path.exists():
-            size = path.stat().st_size
-            print(f"  ✓ {f} ({size:,} bytes)")
+    lines = []
+    say = lines.append
+    say("\nChecking extension data...")
+
+    entries = scan_paths(f for f, _ in EXTENSION_FILES)
+    for f, required in EXTENSION_FILES:
+        entry = entries[f]
+        if entry is not None:
+            size = entry.stat().st_size
+            say(f"  ✓ {f} ({size:,} bytes)")
         elif required:
-            print(f"  ⚠ {f} (not found - will be created by 03_collect_extension.py)")
+            say(f"  ⚠ {f} (not found - will be created by 03_collect_extension.py)")
         else:
-            print(f"  - {f} (optional, not found)")
+            say(f"  - {f} (optional, not found)")
 
+    print("\n".join(lines))
     return True
 
 
+def setup_signature():
+    """
+    Signature of everything the checks look at: (mtime_ns, size) of each
+    file, existence of each directory (directory mtimes change whenever
+    outputs are written), package availability and the interpreter.
+    """
+    paths = (REQUIRED_DIRS + REQUIRED_FILES + [f for f, _ in EXTENSION_FILES]
+             + ["code/01_setup.py"])
+    stats = {}
+    for rel, entry in scan_paths(paths).items():
+        if entry is None:
+            stats[rel] = None
+        elif entry.is_dir():
+            stats[rel] = True
+        else:
+            st = entry.stat()
+            stats[rel] = [st.st_mtime_ns, st.st_size]
+
+    packages = {pkg: find_spec(pkg) is not None
+                for pkg in [*PACKAGES, *OPTIONAL_PACKAGES]}
+
+    return {"python": sys.executable, "paths": stats, "packages": packages}
+
+
+def load_setup_cache():
+    """Signature saved by the last successful run, or None."""
+    try:
+        return json.loads(CACHE_FILE.read_text())["sig"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_setup_cache(sig):
+    """Write the signature atomically (write a temp file, then rename)."""
+    tmp = CACHE_FILE.with_name(CACHE_FILE.name + ".tmp")
+    tmp.write_text(json.dumps({"sig": sig}))
+    os.replace(tmp, CACHE_FILE)
+
+
 def main():
     """Run all setup checks."""
     print("=" * 60)
     print("VBM REPLICATION PROJECT SETUP")
     print("=" * 60)
 
+    if load_setup_cache() == setup_signature():
+        print("Setup cache hit: nothing changed since the last successful run.")
+        return 0
+
     checks = [
         ("Directory structure", check_directory_structure),
         ("Dependencies", check_dependencies),
@@ -159,29 +249,33 @@ def main():
         results[name] = check_func()
 
     # Summary
-    print("\n" + "=" * 60)
-    print("SETUP SUMMARY")
-    print("=" * 60)
+    lines = []
+    say = lines.append
+    say("\n" + "=" * 60)
+    say("SETUP SUMMARY")
+    say("=" * 60)
 
     all_pass = True
     for name, passed in results.items():
         status = "✓ Pass" if passed else "✗ Fail"
-        print(f"  {name}: {status}")
+        say(f"  {name}: {status}")
         if not passed:
             all_pass = False
 
     if all_pass:
-        print("\n*** Setup complete. Ready to run analysis. ***")
-        print("\nNext steps:")
-        print("  1. Run: python code/00_run_all.py")
-        print("  Or run individual scripts:")
-        print("  2. python code/02_replicate.py")
-        print("  3. python code/03_collect_extension.py")
-        print("  4. python code/04_merge_extension.py")
-        print("  5. python code/05_extension_analysis.py")
+        save_setup_cache(setup_signature())
+        say("\n*** Setup complete. Ready to run analysis. ***")
+        say("\nNext steps:")
+        say("  1. Run: python code/00_run_all.py")
+        say("  Or run individual scripts:")
+        say("  2. python code/02_replicate.py")
+        say("  3. python code/03_collect_extension.py")
+        say("  4. python code/04_merge_extension.py")
+        say("  5. python code/05_extension_analysis.py")
     else:
-        print("\n*** Setup incomplete. Please address the issues above. ***")
+        say("\n*** Setup incomplete. Please address the issues above. ***")
 
+    print("\n".join(lines))
     return 0 if all_pass else 1
 
 
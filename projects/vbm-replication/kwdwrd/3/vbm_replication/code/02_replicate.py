@@ -15,34 +15,110 @@ differ due to implementation differences between Stata's reghdfe and Python.
 
 import pandas as pd
 import numpy as np
-from linearmodels.panel import PanelOLS
 import warnings
-warnings.filterwarnings('ignore')
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
 
-# Try to use pyfixest if available
-try:
-    import pyfixest as pf
-    HAS_PYFIXEST = True
-except ImportError:
-    HAS_PYFIXEST = False
+# Regression backend, imported on first use by regression_engine()
+_ENGINE = None
+
+
+@dataclass(slots=True)
+class FEResult:
+    """Treatment estimate from one two-way fixed effects regression."""
+    coef: float
+    se: float
+    n_obs: int
+    n_counties: int
+    n_elections: int
 
 # =============================================================================
 # LOAD DATA
 # =============================================================================
 
 def load_analysis_data(filepath='original/data/modified/analysis.dta'):
-    """Load the main analysis dataset."""
-    df = pd.read_stata(filepath)
-    df['state_year'] = df['state'] + '_' + df['year'].astype(str)
+    """
+    Load the main analysis dataset.
+
+    The decoded .dta (with state_year added) is cached as a Parquet file
+    next to it and reused while it is newer than the .dta. The id columns
+    are returned as categoricals so each regression works on their
+    integer codes instead of re-hashing the raw ids.
+    """
+    source = Path(filepath)
+    cache = source.with_suffix('.parquet')
+    if cache.exists() and cache.stat().st_mtime >= source.stat().st_mtime:
+        df = pd.read_parquet(cache, engine='pyarrow')
+    else:
+        df = pd.read_stata(source)
+        df['state_year'] = df['state'] + '_' + df['year'].astype(str)
+        df.to_parquet(cache, engine='pyarrow', compression='zstd')
+
+    for col in ('county_id', 'state_year_id', 'state'):
+        df[col] = df[col].astype('category')
     return df
 
 # =============================================================================
 # REGRESSION FUNCTION
 # =============================================================================
 
+def regression_engine():
+    """
+    Import the regression backend on first use.
+
+    Uses pyfixest if available, else the numpy within estimator below.
+    Deferring the import keeps loading this module (and its helpers) cheap.
+
+    Returns:
+    --------
+    (name, module) with name 'pyfixest' or 'numpy'
+    """
+    global _ENGINE
+    if _ENGINE is None:
+        try:
+            import pyfixest as pf
+            _ENGINE = ('pyfixest', pf)
+        except ImportError:
+            _ENGINE = ('numpy', None)
+    return _ENGINE
+
+
+def _group_demean(v, codes, n_groups):
+    """Subtract group means (by integer codes) from each column of v."""
+    counts = np.maximum(np.bincount(codes, minlength=n_groups), 1)
+    means = np.column_stack([
+        np.bincount(codes, weights=col, minlength=n_groups) for col in v.T
+    ]) / counts[:, None]
+    return v - means[codes]
+
+
+def absorb_fixed_effects(v, entity_codes, time_codes, tol=1e-10, max_iter=1000):
+    """
+    Sweep entity and time fixed effects out of the columns of v.
+
+    Alternates entity and time demeaning until the time step no longer
+    moves the data (one pass is exact on balanced panels).
+
+    Returns:
+    --------
+    (demeaned array, converged flag)
+    """
+    n_entities = entity_codes.max() + 1
+    n_times = time_codes.max() + 1
+    for _ in range(max_iter):
+        v = _group_demean(v, entity_codes, n_entities)
+        v_new = _group_demean(v, time_codes, n_times)
+        if np.max(np.abs(v_new - v)) < tol:
+            return v_new, True
+        v = v_new
+    return v, False
+
+
 def run_twfe_regression(df, outcome_var, treatment_var='treat',
-                       entity_var='county_id', time_var='state_year_id'):
+                       entity_var='county_id', time_var='state_year_id', mask=None):
     """
     Run two-way fixed effects panel regression.
 
@@ -55,63 +131,134 @@ def run_twfe_regression(df, outcome_var, treatment_var='treat',
     treatment_var : str - Treatment variable
     entity_var : str - Entity (county) identifier
     time_var : str - Time (state-year) identifier
+    mask : boolean array, optional - Rows of df to use (default: all)
 
     Returns:
     --------
-    dict with coefficient, SE, N, n_counties, n_elections
+    FEResult with coefficient, SE, N, n_counties, n_elections
     """
-    # Filter to non-missing
+    # Filter to the sample with non-missing values, as one mask and one
+    # projection (no intermediate copies)
     needed_vars = [outcome_var, treatment_var, entity_var, time_var]
-    df_reg = df[needed_vars].dropna().copy()
+    keep = np.ones(len(df), dtype=bool) if mask is None else np.array(mask, dtype=bool)
+    for var in needed_vars:
+        keep &= df[var].notna().to_numpy()
+    df_reg = df.loc[keep, needed_vars]
 
     if len(df_reg) == 0:
         return None
 
-    if HAS_PYFIXEST:
+    engine, backend = regression_engine()
+    if engine == 'pyfixest':
         # Use pyfixest (more similar to reghdfe)
-        model = pf.feols(
-            f"{outcome_var} ~ {treatment_var} | {entity_var} + {time_var}",
-            data=df_reg,
-            vcov={'CRV1': entity_var}
-        )
+        # Silence pyfixest's fit warnings here only, not process-wide
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = backend.feols(
+                f"{outcome_var} ~ {treatment_var} | {entity_var} + {time_var}",
+                data=df_reg,
+                vcov={'CRV1': entity_var}
+            )
         coef = model.coef()[treatment_var]
         se = model.se()[treatment_var]
         n_obs = len(df_reg)  # pyfixest doesn't have nobs attribute
-    else:
-        # Use linearmodels
-        df_panel = df_reg.set_index([entity_var, time_var])
-        y = df_panel[outcome_var]
-        X = df_panel[[treatment_var]]
-
-        model = PanelOLS(y, X, entity_effects=True, time_effects=True)
-        result = model.fit(cov_type='clustered', cluster_entity=True)
-
-        coef = result.params[treatment_var]
-        se = result.std_errors[treatment_var]
-        n_obs = int(result.nobs)
 
     n_counties = df_reg[entity_var].nunique()
     n_elections = df_reg[time_var].nunique()
 
+    if engine == 'numpy':
+        # Within estimator on the integer category codes: absorb both fixed
+        # effects from [y, x], then OLS of y on x. The entity-clustered SE
+        # uses PanelOLS' scaling N / (N - G - T), so results match the
+        # linearmodels estimates this replaces.
+        entity_codes = df_reg[entity_var].cat.codes.to_numpy()
+        time_codes = df_reg[time_var].cat.codes.to_numpy()
+        yx, converged = absorb_fixed_effects(
+            df_reg[[outcome_var, treatment_var]].to_numpy(dtype=float),
+            entity_codes, time_codes
+        )
+        if not converged:
+            print("  Warning: fixed-effect absorption did not converge")
+        y, x = yx[:, 0], yx[:, 1]
+
+        xx = x @ x
+        coef = (x @ y) / xx
+        score = np.bincount(entity_codes, weights=x * (y - coef * x))
+        n_obs = len(df_reg)
+        se = np.sqrt(n_obs / (n_obs - n_counties - n_elections) * (score @ score)) / xx
+
+    return FEResult(coef=coef, se=se, n_obs=n_obs,
+                    n_counties=n_counties, n_elections=n_elections)
+
+# =============================================================================
+# BASIC SPECIFICATIONS
+# =============================================================================
+
+def stack_offices(df):
+    """
+    Stack governor, president and senate Democratic vote shares, keeping
+    only the rows where each office has a vote share.
+    """
+    id_vars = ['state', 'county', 'county_id', 'year', 'state_year_id', 'treat']
+    pieces = []
+    for office in ['dem_share_gov', 'dem_share_pres', 'dem_share_sen']:
+        rows = df[office].notna()
+        pieces.append(df.loc[rows, id_vars].assign(office=office, dem_share=df.loc[rows, office]))
+    return pd.concat(pieces, ignore_index=True)
+
+
+def basic_specs(df):
+    """
+    Samples for the four basic (no trend) specifications.
+
+    Returns:
+    --------
+    {result key: (DataFrame, outcome variable, row mask or None)}
+    """
     return {
-        'coef': coef,
-        'se': se,
-        'n_obs': n_obs,
-        'n_counties': n_counties,
-        'n_elections': n_elections
+        'dem_turnout_basic': (df, 'share_votes_dem', df['share_votes_dem'].notna().to_numpy()),
+        'dem_vote_basic': (stack_offices(df), 'dem_share', None),
+        'turnout_basic': (df, 'turnout_share', df['turnout_share'].notna().to_numpy()),
+        'vbm_basic': (df, 'vbm_share', (df['vbm_share'].notna() & (df['state'] == 'CA')).to_numpy()),
     }
 
+
+def sample_size(spec):
+    """(observations, counties) in a basic_specs() sample."""
+    data, _, mask = spec
+    ids = data['county_id'] if mask is None else data.loc[mask, 'county_id']
+    return len(ids), ids.nunique()
+
+
+def fit_specs(specs, max_workers=1):
+    """
+    Fit run_twfe_regression for each spec.
+
+    The specs share no state, so with max_workers > 1 they run in separate
+    processes. That only pays off with a slow backend (pyfixest); the numpy
+    estimator fits all four in a few milliseconds, less than pool startup.
+    """
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {key: executor.submit(run_twfe_regression, data, outcome, mask=mask)
+                       for key, (data, outcome, mask) in specs.items()}
+            return {key: f.result() for key, f in futures.items()}
+    return {key: run_twfe_regression(data, outcome, mask=mask)
+            for key, (data, outcome, mask) in specs.items()}
+
 # =============================================================================
 # TABLE 2: PARTISAN OUTCOMES
 # =============================================================================
 
-def replicate_table2(df):
+def replicate_table2(specs, fits):
     """
     Replicate Table 2: Partisan Outcomes
 
     Columns 1-3: Democratic turnout share (CA and UT only)
     Columns 4-6: Democratic vote share (all states, stacked by office)
 
+    specs and fits are the basic_specs() samples and their fit_specs() results.
+
     Note: Only Column 1 (basic) and Column 4 (basic) are fully replicated.
     Trend specifications require exact reghdfe implementation.
     """
@@ -125,20 +272,18 @@ def replicate_table2(df):
     print("\nColumns 1-3: Democratic Turnout Share")
     print("-" * 50)
 
-    df_turnout = df[df['share_votes_dem'].notna()].copy()
-    print(f"Sample: {len(df_turnout)} obs, {df_turnout['county_id'].nunique()} counties (CA, UT only)")
+    n, n_counties = sample_size(specs['dem_turnout_basic'])
+    print(f"Sample: {n} obs, {n_counties} counties (CA, UT only)")
 
     # Column 1: Basic
-    r1 = run_twfe_regression(df_turnout, 'share_votes_dem')
+    r1 = fits['dem_turnout_basic']
     results['dem_turnout_basic'] = r1
-    print(f"Col 1 (Basic):    coef={r1['coef']:.4f}, SE={r1['se']:.4f}")
+    print(f"Col 1 (Basic):    coef={r1.coef:.4f}, SE={r1.se:.4f}")
     print(f"                  Original: 0.007 (0.003)")
 
     # Columns 2-3: Note about trends
-    results['dem_turnout_linear'] = {'coef': np.nan, 'se': np.nan, 'n_obs': r1['n_obs'],
-                                      'n_counties': r1['n_counties'], 'n_elections': r1['n_elections']}
-    results['dem_turnout_quad'] = {'coef': np.nan, 'se': np.nan, 'n_obs': r1['n_obs'],
-                                    'n_counties': r1['n_counties'], 'n_elections': r1['n_elections']}
+    results['dem_turnout_linear'] = replace(r1, coef=np.nan, se=np.nan)
+    results['dem_turnout_quad'] = replace(r1, coef=np.nan, se=np.nan)
     print("Col 2-3 (Trends): Requires Stata reghdfe for exact replication")
     print("                  Original: 0.001 (0.001), 0.001 (0.001)")
 
@@ -146,31 +291,18 @@ def replicate_table2(df):
     print("\nColumns 4-6: Democratic Vote Share (stacked by office)")
     print("-" * 50)
 
-    # Reshape: stack governor, president, senate
-    df_vote = df[['state', 'county', 'county_id', 'year', 'state_year_id',
-                  'treat', 'dem_share_gov', 'dem_share_pres', 'dem_share_sen']].copy()
-
-    df_stacked = pd.melt(
-        df_vote,
-        id_vars=['state', 'county', 'county_id', 'year', 'state_year_id', 'treat'],
-        value_vars=['dem_share_gov', 'dem_share_pres', 'dem_share_sen'],
-        var_name='office',
-        value_name='dem_share'
-    )
-    df_stacked = df_stacked.dropna(subset=['dem_share'])
-    print(f"Stacked sample: {len(df_stacked)} obs, {df_stacked['county_id'].nunique()} counties")
+    n, n_counties = sample_size(specs['dem_vote_basic'])
+    print(f"Stacked sample: {n} obs, {n_counties} counties")
 
     # Column 4: Basic
-    r4 = run_twfe_regression(df_stacked, 'dem_share')
+    r4 = fits['dem_vote_basic']
     results['dem_vote_basic'] = r4
-    print(f"Col 4 (Basic):    coef={r4['coef']:.4f}, SE={r4['se']:.4f}")
+    print(f"Col 4 (Basic):    coef={r4.coef:.4f}, SE={r4.se:.4f}")
     print(f"                  Original: 0.028 (0.011)")
 
     # Columns 5-6: Note about trends
-    results['dem_vote_linear'] = {'coef': np.nan, 'se': np.nan, 'n_obs': r4['n_obs'],
-                                   'n_counties': r4['n_counties'], 'n_elections': r4['n_elections']}
-    results['dem_vote_quad'] = {'coef': np.nan, 'se': np.nan, 'n_obs': r4['n_obs'],
-                                 'n_counties': r4['n_counties'], 'n_elections': r4['n_elections']}
+    results['dem_vote_linear'] = replace(r4, coef=np.nan, se=np.nan)
+    results['dem_vote_quad'] = replace(r4, coef=np.nan, se=np.nan)
     print("Col 5-6 (Trends): Requires Stata reghdfe for exact replication")
     print("                  Original: 0.011 (0.004), 0.007 (0.003)")
 
@@ -180,12 +312,14 @@ def replicate_table2(df):
 # TABLE 3: PARTICIPATION OUTCOMES
 # =============================================================================
 
-def replicate_table3(df):
+def replicate_table3(specs, fits):
     """
     Replicate Table 3: Participation Outcomes
 
     Columns 1-3: Turnout (all states)
     Columns 4-6: VBM share (CA only)
+
+    specs and fits are the basic_specs() samples and their fit_specs() results.
     """
     results = {}
 
@@ -197,38 +331,34 @@ def replicate_table3(df):
     print("\nColumns 1-3: Turnout")
     print("-" * 50)
 
-    df_turnout = df[df['turnout_share'].notna()].copy()
-    print(f"Sample: {len(df_turnout)} obs, {df_turnout['county_id'].nunique()} counties")
+    n, n_counties = sample_size(specs['turnout_basic'])
+    print(f"Sample: {n} obs, {n_counties} counties")
 
     # Column 1: Basic
-    r1 = run_twfe_regression(df_turnout, 'turnout_share')
+    r1 = fits['turnout_basic']
     results['turnout_basic'] = r1
-    print(f"Col 1 (Basic):    coef={r1['coef']:.4f}, SE={r1['se']:.4f}")
+    print(f"Col 1 (Basic):    coef={r1.coef:.4f}, SE={r1.se:.4f}")
     print(f"                  Original: 0.021 (0.009)")
 
-    results['turnout_linear'] = {'coef': np.nan, 'se': np.nan, 'n_obs': r1['n_obs'],
-                                  'n_counties': r1['n_counties'], 'n_elections': r1['n_elections']}
-    results['turnout_quad'] = {'coef': np.nan, 'se': np.nan, 'n_obs': r1['n_obs'],
-                                'n_counties': r1['n_counties'], 'n_elections': r1['n_elections']}
+    results['turnout_linear'] = replace(r1, coef=np.nan, se=np.nan)
+    results['turnout_quad'] = replace(r1, coef=np.nan, se=np.nan)
     print("Col 2-3 (Trends): Original: 0.022 (0.007), 0.021 (0.008)")
 
     # ----- Columns 4-6: VBM Share (CA only) -----
     print("\nColumns 4-6: VBM Share (CA only)")
     print("-" * 50)
 
-    df_vbm = df[(df['vbm_share'].notna()) & (df['state'] == 'CA')].copy()
-    print(f"Sample: {len(df_vbm)} obs, {df_vbm['county_id'].nunique()} counties")
+    n, n_counties = sample_size(specs['vbm_basic'])
+    print(f"Sample: {n} obs, {n_counties} counties")
 
     # Column 4: Basic
-    r4 = run_twfe_regression(df_vbm, 'vbm_share')
+    r4 = fits['vbm_basic']
     results['vbm_basic'] = r4
-    print(f"Col 4 (Basic):    coef={r4['coef']:.4f}, SE={r4['se']:.4f}")
+    print(f"Col 4 (Basic):    coef={r4.coef:.4f}, SE={r4.se:.4f}")
     print(f"                  Original: 0.186 (0.027)")
 
-    results['vbm_linear'] = {'coef': np.nan, 'se': np.nan, 'n_obs': r4['n_obs'],
-                              'n_counties': r4['n_counties'], 'n_elections': r4['n_elections']}
-    results['vbm_quad'] = {'coef': np.nan, 'se': np.nan, 'n_obs': r4['n_obs'],
-                            'n_counties': r4['n_counties'], 'n_elections': r4['n_elections']}
+    results['vbm_linear'] = replace(r4, coef=np.nan, se=np.nan)
+    results['vbm_quad'] = replace(r4, coef=np.nan, se=np.nan)
     print("Col 5-6 (Trends): Original: 0.157 (0.035), 0.136 (0.085)")
 
     return results
@@ -260,69 +390,48 @@ def create_comparison_table(results_t2, results_t3):
 
     all_results = {**results_t2, **results_t3}
 
-    rows = []
-    for key, (orig_coef, orig_se) in original.items():
-        repl = all_results.get(key, {})
-        repl_coef = repl.get('coef', np.nan)
-        repl_se = repl.get('se', np.nan)
-
-        if np.isnan(repl_coef):
-            diff = np.nan
-            match = "N/A"
-        else:
-            diff = repl_coef - orig_coef
-            if abs(diff) < 0.002:
-                match = "Exact"
-            elif abs(diff) < 0.005:
-                match = "Close"
-            else:
-                match = "Differs"
-
-        rows.append({
-            'Outcome': key,
-            'Original_Coef': orig_coef,
-            'Original_SE': orig_se,
-            'Replicated_Coef': repl_coef,
-            'Replicated_SE': repl_se,
-            'Difference': diff,
-            'Match': match
-        })
-
-    return pd.DataFrame(rows)
+    keys = list(original)
+    orig = np.array([original[k] for k in keys])
+    missing = FEResult(np.nan, np.nan, 0, 0, 0)
+    repl = np.array([(all_results.get(k, missing).coef,
+                      all_results.get(k, missing).se) for k in keys])
+
+    diff = repl[:, 0] - orig[:, 0]
+    abs_diff = np.abs(diff)
+    match = np.select(
+        [np.isnan(diff), abs_diff < 0.002, abs_diff < 0.005],
+        ['N/A', 'Exact', 'Close'],
+        default='Differs'
+    )
+
+    return pd.DataFrame({
+        'Outcome': keys,
+        'Original_Coef': orig[:, 0],
+        'Original_SE': orig[:, 1],
+        'Replicated_Coef': repl[:, 0],
+        'Replicated_SE': repl[:, 1],
+        'Difference': diff,
+        'Match': match
+    })
 
 # =============================================================================
 # SAVE RESULTS
 # =============================================================================
 
+def results_frame(results):
+    """Tabulate an {outcome: FEResult} mapping, one column per field."""
+    df = pd.DataFrame([asdict(r) for r in results.values()])
+    df = df.rename(columns={'coef': 'coefficient', 'se': 'std_error'})
+    df.insert(0, 'outcome', list(results))
+    return df
+
+
 def save_results(results_t2, results_t3, comparison_df, output_dir='output/tables'):
     """Save all results to CSV files."""
     os.makedirs(output_dir, exist_ok=True)
 
-    # Table 2 results
-    rows_t2 = []
-    for key, vals in results_t2.items():
-        rows_t2.append({
-            'outcome': key,
-            'coefficient': vals['coef'],
-            'std_error': vals['se'],
-            'n_obs': vals['n_obs'],
-            'n_counties': vals['n_counties'],
-            'n_elections': vals['n_elections']
-        })
-    pd.DataFrame(rows_t2).to_csv(f'{output_dir}/table2_replication.csv', index=False)
-
-    # Table 3 results
-    rows_t3 = []
-    for key, vals in results_t3.items():
-        rows_t3.append({
-            'outcome': key,
-            'coefficient': vals['coef'],
-            'std_error': vals['se'],
-            'n_obs': vals['n_obs'],
-            'n_counties': vals['n_counties'],
-            'n_elections': vals['n_elections']
-        })
-    pd.DataFrame(rows_t3).to_csv(f'{output_dir}/table3_replication.csv', index=False)
+    results_frame(results_t2).to_csv(f'{output_dir}/table2_replication.csv', index=False)
+    results_frame(results_t3).to_csv(f'{output_dir}/table3_replication.csv', index=False)
 
     # Comparison table
     comparison_df.to_csv(f'{output_dir}/replication_comparison.csv', index=False)
@@ -334,6 +443,11 @@ def save_results(results_t2, results_t3, comparison_df, output_dir='output/table
 # =============================================================================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replicate Thompson et al. (2020) Tables 2 and 3')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes for the four basic regressions (default: 1)')
+    args = parser.parse_args()
+
     print("="*70)
     print("VBM REPLICATION: Thompson et al. (2020)")
     print("="*70)
@@ -341,11 +455,13 @@ if __name__ == "__main__":
     # Load data
     df = load_analysis_data()
     print(f"\nLoaded analysis data: {df.shape[0]} observations")
-    print(f"Using pyfixest: {HAS_PYFIXEST}")
+    print(f"Using pyfixest: {regression_engine()[0] == 'pyfixest'}")
 
-    # Replicate tables
-    results_t2 = replicate_table2(df)
-    results_t3 = replicate_table3(df)
+    # Fit the four basic specifications, then report them by table
+    specs = basic_specs(df)
+    fits = fit_specs(specs, max_workers=args.jobs)
+    results_t2 = replicate_table2(specs, fits)
+    results_t3 = replicate_table3(specs, fits)
 
     # Create comparison
     print("\n" + "="*70)
@@ -18,6 +18,7 @@ and may require manual verification.
 import pandas as pd
 import numpy as np
 import os
+from functools import lru_cache
 
 # Paths
 DATA_DIR = 'data'
@@ -80,12 +81,23 @@ def create_vca_adoption_data():
 # EXTENSION ELECTION DATA
 # =============================================================================
 
+@lru_cache(maxsize=1)
 def load_2020_presidential():
-    """Load 2020 presidential results (already downloaded)."""
+    """
+    Load 2020 presidential results (already downloaded).
+
+    The result is cached and shared between callers; do not modify it.
+    """
 
-    df = pd.read_csv(f'{RAW_DIR}/countypres_2000-2020.csv')
+    # Decode only the columns used below
+    df = pd.read_csv(
+        f'{RAW_DIR}/countypres_2000-2020.csv',
+        engine='pyarrow',
+        usecols=['state_name', 'county_name', 'votes_dem', 'votes_gop', 'total_votes'],
+        dtype={'state_name': str, 'county_name': str}
+    )
 
-    # Filter to our three states
+    # Filter to our three states before any string work
     states = {'California': 'CA', 'Utah': 'UT', 'Washington': 'WA'}
     df = df[df['state_name'].isin(states.keys())].copy()
 
@@ -101,6 +113,12 @@ def load_2020_presidential():
     return out
 
 
+@lru_cache(maxsize=1)
+def load_2020_counties():
+    """Unique (state, county) pairs in the 2020 data (cached; do not modify)."""
+    return load_2020_presidential()[['state', 'county']].drop_duplicates()
+
+
 def create_placeholder_2022_2024():
     """
     Create placeholder structure for 2022 and 2024 data.
@@ -112,8 +130,7 @@ def create_placeholder_2022_2024():
     """
 
     # Get county list from 2020 data
-    df_2020 = load_2020_presidential()
-    counties = df_2020[['state', 'county']].drop_duplicates()
+    counties = load_2020_counties()
 
     # 2022 gubernatorial placeholder
     df_2022 = counties.copy()
@@ -150,8 +167,7 @@ def create_cvap_placeholder():
     For 2020-2024, use 2020 Census-based estimates.
     """
 
-    df_2020 = load_2020_presidential()
-    counties = df_2020[['state', 'county']].drop_duplicates()
+    counties = load_2020_counties()
 
     cvap = counties.copy()
     cvap['cvap_2020'] = np.nan
@@ -178,52 +194,22 @@ def create_treatment_variable():
     # California VCA adoption
     vca = create_vca_adoption_data()
 
-    # Get all CA counties from 2020 data
-    df_2020 = load_2020_presidential()
-    ca_counties = df_2020[df_2020['state'] == 'CA']['county'].unique()
-
-    # Create treatment for each year
-    years = [2020, 2022, 2024]
-    records = []
-
-    for county in ca_counties:
-        vca_year = vca[vca['county'] == county]['vca_first_year'].values
-        vca_year = vca_year[0] if len(vca_year) > 0 else 9999  # Never adopted
-
-        for year in years:
-            records.append({
-                'state': 'CA',
-                'county': county,
-                'year': year,
-                'treat': 1 if year >= vca_year else 0,
-                'vca_first_year': vca_year if vca_year < 9999 else np.nan
-            })
-
-    # Utah: all counties VBM since 2019
-    ut_counties = df_2020[df_2020['state'] == 'UT']['county'].unique()
-    for county in ut_counties:
-        for year in years:
-            records.append({
-                'state': 'UT',
-                'county': county,
-                'year': year,
-                'treat': 1,  # All VBM
-                'vca_first_year': np.nan
-            })
-
-    # Washington: all counties VBM since 2011
-    wa_counties = df_2020[df_2020['state'] == 'WA']['county'].unique()
-    for county in wa_counties:
-        for year in years:
-            records.append({
-                'state': 'WA',
-                'county': county,
-                'year': year,
-                'treat': 1,  # All VBM
-                'vca_first_year': np.nan
-            })
-
-    return pd.DataFrame(records)
+    # County x year grid from the 2020 data, ordered CA, UT, WA
+    counties = load_2020_counties().sort_values('state', kind='stable')
+    years = pd.DataFrame({'year': [2020, 2022, 2024]})
+    treat = counties.merge(years, how='cross')
+
+    # Attach CA adoption years (NaN = never adopted, or not CA)
+    treat = treat.merge(vca[['state', 'county', 'vca_first_year']],
+                        on=['state', 'county'], how='left')
+
+    # Utah (since 2019) and Washington (since 2011) are all VBM
+    treat.insert(3, 'treat', np.where(
+        (treat['state'] != 'CA') | (treat['year'] >= treat['vca_first_year']), 1, 0
+    ))
+    treat['vca_first_year'] = treat['vca_first_year'].astype(float)
+
+    return treat
 
 
 # =============================================================================
@@ -240,13 +226,16 @@ if __name__ == "__main__":
     vca = create_vca_adoption_data()
     vca.to_csv(f'{EXTENSION_DIR}/california_vca_adoption.csv', index=False)
     print(f"   VCA counties by year:")
-    print(vca.groupby('vca_first_year').size())
+    years, counts = np.unique(vca['vca_first_year'].to_numpy(), return_counts=True)
+    for year, count in zip(years.tolist(), counts.tolist()):
+        print(f"     {year}: {count}")
 
     # 2020 Presidential
     print("\n2. 2020 Presidential Results")
     pres_2020 = load_2020_presidential()
     pres_2020.to_csv(f'{EXTENSION_DIR}/three_states_2020_pres.csv', index=False)
-    print(f"   Counties by state: {dict(pres_2020.groupby('state').size())}")
+    states, counts = np.unique(pres_2020['state'].to_numpy(), return_counts=True)
+    print(f"   Counties by state: {dict(zip(states.tolist(), counts.tolist()))}")
 
     # 2022 and 2024 placeholders
     print("\n3. 2022 and 2024 Placeholders")
@@ -266,7 +255,10 @@ if __name__ == "__main__":
     treat = create_treatment_variable()
     treat.to_csv(f'{EXTENSION_DIR}/treatment_extension.csv', index=False)
     print(f"   Treatment by state-year:")
-    print(treat.groupby(['state', 'year'])['treat'].mean())
+    codes, cells = pd.factorize(pd.MultiIndex.from_frame(treat[['state', 'year']]))
+    shares = np.bincount(codes, weights=treat['treat'].to_numpy()) / np.bincount(codes)
+    for (state, year), share in zip(cells, shares):
+        print(f"     {state} {year}: {share:.6f}")
 
     print("\n" + "="*70)
     print("DATA COLLECTION SUMMARY")
@@ -12,11 +12,20 @@ Key tasks:
 3. Create consistent identifiers (county_id, state_year_id)
 4. Compute outcome variables for extension years
 5. Apply treatment variable for California VCA expansion
-6. Output combined dataset
+6. Output combined dataset (Parquet; CSV and Stata copies on request)
+
+Usage:
+    python code/04_merge_extension.py [--csv] [--dta]
 """
 
+import argparse
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+from pandas.api.types import union_categoricals
+from pyarrow import csv as pa_csv
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
 # Set paths
@@ -29,15 +38,14 @@ OUTPUT_DIR = DATA_DIR / "combined"
 # Create output directory
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Low-cardinality string columns, held as Categoricals throughout
+CATEGORICAL_COLS = ['state', 'county', 'prim_or_gen']
+
 
 def load_original_data():
     """Load and prepare original analysis dataset."""
     print("Loading original analysis.dta...")
-    df = pd.read_stata(ORIGINAL_DIR / "analysis.dta")
-
-    print(f"  Original shape: {df.shape}")
-    print(f"  Years: {sorted(df['year'].unique())}")
-    print(f"  Counties: {df['county'].nunique()}")
+    path = ORIGINAL_DIR / "analysis.dta"
 
     # Keep key variables for extension analysis
     key_vars = [
@@ -51,81 +59,155 @@ def load_original_data():
         'county_id', 'state_year_id', 'pres', 'prim'
     ]
 
-    # Keep only variables that exist
-    existing_vars = [v for v in key_vars if v in df.columns]
-    df = df[existing_vars].copy()
+    # Read the variable list from the header, then decode only the key
+    # variables that exist (no full read followed by a projection copy)
+    with pd.read_stata(path, iterator=True) as reader:
+        all_vars = list(reader.variable_labels())
+    existing_vars = [v for v in key_vars if v in all_vars]
+    df = pd.read_stata(path, columns=existing_vars)
+
+    # Store indicators, year and identifiers in the smallest integer type
+    # that holds them (columns with missing values stay float)
+    for col in ['treat', 'pres', 'prim', 'year', 'county_id', 'state_year_id']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    for col in CATEGORICAL_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    print(f"  Original shape: {(len(df), len(all_vars))}")
+    print(f"  Years: {sorted(df['year'].unique())}")
+    print(f"  Counties: {df['county'].nunique()}")
 
     return df
 
 
+def read_csv_columns(path, column_types):
+    """
+    Read only the given columns of a CSV with pyarrow's multithreaded reader.
+
+    column_types maps column name -> Arrow type, so no type inference runs.
+    """
+    table = pa_csv.read_csv(
+        path,
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(column_types),
+            column_types=column_types
+        )
+    )
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
 def load_extension_data():
     """Load extension data for 2020-2024."""
     print("\nLoading extension data...")
 
     # Load 2020 presidential results
-    pres_2020 = pd.read_csv(EXTENSION_DIR / "three_states_2020_pres.csv")
+    pres_2020 = read_csv_columns(EXTENSION_DIR / "three_states_2020_pres.csv", {
+        'state': pa.string(), 'county': pa.string(),
+        'dem_votes': pa.float64(), 'rep_votes': pa.float64(), 'total_votes': pa.float64()
+    })
     print(f"  2020 presidential: {len(pres_2020)} counties")
 
     # Load treatment extension
-    treatment = pd.read_csv(EXTENSION_DIR / "treatment_extension.csv")
+    treatment = read_csv_columns(EXTENSION_DIR / "treatment_extension.csv", {
+        'state': pa.string(), 'county': pa.string(), 'year': pa.int32(),
+        'treat': pa.int64(), 'vca_first_year': pa.float64()
+    })
     print(f"  Treatment extension: {len(treatment)} county-years")
 
     # Load VCA adoption data
-    vca = pd.read_csv(EXTENSION_DIR / "california_vca_adoption.csv")
+    vca = read_csv_columns(EXTENSION_DIR / "california_vca_adoption.csv", {
+        'county': pa.string(), 'vca_first_year': pa.int64(), 'state': pa.string()
+    })
     print(f"  VCA counties: {len(vca)}")
 
     return pres_2020, treatment, vca
 
 
+def county_keys(frame):
+    """Pack each row's (state, county) category codes into one integer."""
+    n_county = len(frame['county'].cat.categories)
+    return (frame['state'].cat.codes.to_numpy(np.int64) * n_county
+            + frame['county'].cat.codes.to_numpy(np.int64))
+
+
+def first_rows(frame):
+    """Positions of the first row of each (state, county), in category-code order."""
+    _, first = np.unique(county_keys(frame), return_index=True)
+    return first
+
+
+def county_codes(frame, county_index):
+    """Position of each (state, county) row of frame in county_index, -1 if absent."""
+    return county_index.get_indexer(pd.MultiIndex.from_frame(frame[['state', 'county']]))
+
+
 def create_extension_panel(pres_2020, treatment, vca, original_df):
     """Create extension panel dataset for 2020, 2022, 2024."""
     print("\nCreating extension panel...")
 
-    # Get unique counties from original data
-    counties = original_df[['state', 'county']].drop_duplicates()
+    # Get unique counties from original data (sorted by category codes)
+    counties = original_df[['state', 'county']].iloc[first_rows(original_df)]
     print(f"  Counties to extend: {len(counties)}")
 
     # Create panel structure for extension years
-    extension_years = [2020, 2022, 2024]
-
-    # Cross product: counties x years
-    panels = []
-    for year in extension_years:
-        panel = counties.copy()
-        panel['year'] = year
-        panels.append(panel)
-
-    extension_df = pd.concat(panels, ignore_index=True)
+    extension_years = np.array([2020, 2022, 2024])
+
+    # Cross product: counties x years, built in one shot (year-major)
+    n_years = len(extension_years)
+    extension_df = pd.DataFrame({
+        'state': pd.Categorical.from_codes(np.tile(counties['state'].cat.codes, n_years),
+                                           dtype=counties['state'].dtype),
+        'county': pd.Categorical.from_codes(np.tile(counties['county'].cat.codes, n_years),
+                                            dtype=counties['county'].dtype),
+        'year': np.repeat(extension_years, len(counties))
+    })
     print(f"  Extension panel shape: {extension_df.shape}")
 
-    # Merge treatment indicator
+    # Integer county key: position in `counties`. The string keys are hashed
+    # once here; every later merge runs on this key (dropped after assigning
+    # identifiers).
+    county_index = pd.MultiIndex.from_frame(counties)
+    extension_df['_county'] = np.tile(np.arange(len(counties)), n_years)
+
+    # Merge treatment indicator (counties outside the panel cannot match)
+    codes = county_codes(treatment, county_index)
     extension_df = extension_df.merge(
-        treatment[['state', 'county', 'year', 'treat', 'vca_first_year']],
-        on=['state', 'county', 'year'],
-        how='left'
+        treatment.loc[codes >= 0, ['year', 'treat', 'vca_first_year']].assign(_county=codes[codes >= 0]),
+        on=['_county', 'year'],
+        how='left',
+        validate='many_to_one'
     )
 
     # Merge 2020 presidential results
-    pres_2020_subset = pres_2020[['state', 'county', 'dem_votes', 'rep_votes', 'total_votes']].copy()
-    pres_2020_subset['year'] = 2020
+    codes = county_codes(pres_2020, county_index)
+    pres_2020_subset = pres_2020.loc[codes >= 0, ['dem_votes', 'rep_votes', 'total_votes']].assign(
+        _county=codes[codes >= 0], year=2020
+    )
 
     extension_df = extension_df.merge(
         pres_2020_subset,
-        on=['state', 'county', 'year'],
-        how='left'
-    )
-
-    # Calculate Democratic share for president (2020)
-    extension_df['dem_share_pres'] = np.where(
-        extension_df['year'] == 2020,
-        extension_df['dem_votes'] / (extension_df['dem_votes'] + extension_df['rep_votes']),
-        np.nan
+        on=['_county', 'year'],
+        how='left',
+        validate='many_to_one'
     )
 
-    # Set pres indicator
-    extension_df['pres'] = extension_df['year'].isin([2020, 2024]).astype(int)
-    extension_df['prim'] = 0  # All extension years are general elections
-    extension_df['prim_or_gen'] = 'gen'
+    # Calculate Democratic share for president (2020 rows only; NaN elsewhere
+    # and where there are no two-party votes)
+    is_2020 = extension_df['year'].to_numpy() == 2020
+    dem = extension_df['dem_votes'].to_numpy(dtype=np.float64)[is_2020]
+    two_party = dem + extension_df['rep_votes'].to_numpy(dtype=np.float64)[is_2020]
+    dem_share = np.full(len(extension_df), np.nan)
+    dem_share[is_2020] = np.divide(dem, two_party, out=np.full_like(dem, np.nan), where=two_party > 0)
+    extension_df['dem_share_pres'] = dem_share
+
+    # Set pres indicator (small integer types, matching the Stata storage)
+    extension_df['pres'] = extension_df['year'].isin([2020, 2024]).astype(np.int8)
+    extension_df['prim'] = np.zeros(len(extension_df), dtype=np.int8)  # All extension years are general elections
+    extension_df['prim_or_gen'] = pd.Categorical(np.full(len(extension_df), 'gen'))
+    extension_df['year'] = extension_df['year'].astype(np.int16)
 
     # Clean up
     extension_df = extension_df.drop(columns=['dem_votes', 'rep_votes', 'total_votes'], errors='ignore')
@@ -137,8 +219,8 @@ def assign_identifiers(df, original_df):
     """Assign county_id and state_year_id consistent with original data."""
     print("\nAssigning identifiers...")
 
-    # Get existing county_id mapping from original data
-    county_map = original_df[['state', 'county', 'county_id']].drop_duplicates()
+    # Get existing county_id mapping from original data (first id per county)
+    county_map = original_df[['state', 'county', 'county_id']].iloc[first_rows(original_df)]
     print(f"  County IDs from original: {len(county_map)}")
 
     # Get max state_year_id from original
@@ -147,39 +229,80 @@ def assign_identifiers(df, original_df):
 
     # Create new state_year_id for extension years
     extension_state_years = df[['state', 'year']].drop_duplicates().sort_values(['state', 'year'])
-    extension_state_years['state_year_id'] = range(
+    extension_state_years['state_year_id'] = np.arange(
         int(max_state_year_id) + 1,
-        int(max_state_year_id) + 1 + len(extension_state_years)
+        int(max_state_year_id) + 1 + len(extension_state_years),
+        dtype=np.int32
     )
 
-    # Merge identifiers
-    df = df.merge(county_map, on=['state', 'county'], how='left')
-    df = df.merge(extension_state_years, on=['state', 'year'], how='left')
+    # Attach identifiers by joining against keyed lookup Series. county_map
+    # lists counties in the same order as the panel's _county codes, so its
+    # position is the join key.
+    county_ids = pd.Series(county_map['county_id'].to_numpy(), name='county_id')
+    state_year_ids = extension_state_years.set_index(['state', 'year'])['state_year_id']
+    df = df.join(county_ids, on='_county', validate='many_to_one')
+    df = df.join(state_year_ids, on=['state', 'year'], validate='many_to_one')
+    df = df.drop(columns='_county')
 
     return df
 
 
+def stack_frames(top, bottom):
+    """
+    Row-stack two frames with the same columns, one np.concatenate per column.
+
+    Numeric columns (numpy promotes dtypes as pandas does) and string columns
+    of the same dtype take the fast path, and pairs of categoricals are
+    merged with union_categoricals; any other column, e.g. a string column
+    padded with NaN, is stacked with pd.concat.
+    """
+    def numeric(series):
+        return isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biuf'
+
+    columns = {}
+    for col in top.columns:
+        a, b = top[col], bottom[col]
+        if numeric(a) and numeric(b):
+            columns[col] = np.concatenate([a.to_numpy(), b.to_numpy()])
+        elif isinstance(a.dtype, pd.StringDtype) and a.dtype == b.dtype:
+            columns[col] = pd.array(np.concatenate([a.to_numpy(), b.to_numpy()]), dtype=a.dtype)
+        elif isinstance(a.dtype, pd.CategoricalDtype) and isinstance(b.dtype, pd.CategoricalDtype):
+            # Unify the categories (sorted) so the codes stay consistent
+            columns[col] = union_categoricals([a, b], sort_categories=True)
+        else:
+            columns[col] = pd.concat([a, b], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def sort_codes(series):
+    """Integer codes that sort like the values (missing values last)."""
+    codes, uniques = pd.factorize(series, sort=True)
+    return np.where(codes < 0, len(uniques), codes)
+
+
 def combine_datasets(original_df, extension_df):
     """Combine original and extension datasets."""
     print("\nCombining datasets...")
 
     # Get common columns
-    common_cols = list(set(original_df.columns) & set(extension_df.columns))
-    print(f"  Common columns: {len(common_cols)}")
-
-    # Ensure extension_df has all columns from original (fill with NaN if missing)
-    for col in original_df.columns:
-        if col not in extension_df.columns:
-            extension_df[col] = np.nan
+    n_common = original_df.columns.intersection(extension_df.columns).size
+    print(f"  Common columns: {n_common}")
 
-    # Reorder columns to match
-    extension_df = extension_df[original_df.columns]
+    # Align extension_df to the original columns in one step: missing columns
+    # are added as NaN, extras dropped, order matched
+    extension_df = extension_df.reindex(columns=original_df.columns)
 
     # Combine
-    combined = pd.concat([original_df, extension_df], ignore_index=True)
+    combined = stack_frames(original_df, extension_df)
 
-    # Sort by county and year
-    combined = combined.sort_values(['state', 'county', 'year']).reset_index(drop=True)
+    # Sort by county and year (stable lexsort on integer codes rather than
+    # string comparisons)
+    order = np.lexsort((
+        combined['year'].to_numpy(),
+        sort_codes(combined['county']),
+        sort_codes(combined['state'])
+    ))
+    combined = combined.take(order).reset_index(drop=True)
 
     print(f"  Combined shape: {combined.shape}")
     print(f"  Year range: {combined['year'].min()} - {combined['year'].max()}")
@@ -211,19 +334,24 @@ def validate_combined_data(combined_df):
     # Check outcome availability
     print("\n4. Outcome variable coverage:")
     outcomes = ['dem_share_pres', 'dem_share_gov', 'turnout_share', 'share_votes_dem']
+    outcomes = [o for o in outcomes if o in combined_df.columns]
+    coverage = combined_df.groupby('year')[outcomes].count()
     for outcome in outcomes:
-        if outcome in combined_df.columns:
-            coverage = combined_df.groupby('year')[outcome].apply(lambda x: x.notna().sum())
-            print(f"\n   {outcome}:")
-            print(f"   {coverage.to_dict()}")
+        print(f"\n   {outcome}:")
+        print(f"   {coverage[outcome].to_dict()}")
 
     # Check for identifier consistency
     print("\n5. Identifier checks:")
     print(f"   Unique county_id: {combined_df['county_id'].nunique()}")
     print(f"   Unique state_year_id: {combined_df['state_year_id'].nunique()}")
 
-    # Check for duplicates
-    dup_count = combined_df.duplicated(subset=['county_id', 'year', 'pres']).sum()
+    # Check for duplicates: rows beyond the first per county-year-pres, from
+    # one packed integer key (factorize codes, so missing ids still compare)
+    key = np.zeros(len(combined_df), dtype=np.int64)
+    for col in ['county_id', 'year', 'pres']:
+        codes, uniques = pd.factorize(combined_df[col], use_na_sentinel=False)
+        key = key * len(uniques) + codes
+    dup_count = len(key) - len(np.unique(key))
     print(f"   Duplicate county-year-pres combinations: {dup_count}")
 
     return True
@@ -234,19 +362,28 @@ def create_analysis_ready_subset(combined_df):
     print("\nCreating analysis-ready subset...")
 
     # Filter to presidential years only (like original analysis)
+    # Both subsets are row selections of combined_df built from masks over
+    # its columns; no copies are needed for writing them out
     pres_years = [2000, 2004, 2008, 2012, 2016, 2020, 2024]
-    pres_df = combined_df[combined_df['year'].isin(pres_years)].copy()
+    pres_mask = np.isin(combined_df['year'].to_numpy(), pres_years)
+    pres_df = combined_df.iloc[pres_mask]
 
     print(f"  Presidential years subset: {pres_df.shape}")
 
     # For extension analysis, focus on California where VCA varies
-    ca_df = pres_df[pres_df['state'] == 'CA'].copy()
+    ca_mask = pres_mask & (combined_df['state'] == 'CA').to_numpy()
+    ca_df = combined_df.iloc[ca_mask]
     print(f"  California only: {ca_df.shape}")
 
     return pres_df, ca_df
 
 
-def main():
+def save_stata(frame, path):
+    """Write frame to Stata, with the categoricals as strings rather than value-labelled codes."""
+    frame.astype({c: 'str' for c in CATEGORICAL_COLS if c in frame}).to_stata(path, write_index=False)
+
+
+def main(write_csv=False, write_dta=False):
     """Main execution."""
     print("="*60)
     print("PHASE 4: MERGE AND PREPARE EXTENSION DATASET")
@@ -274,21 +411,41 @@ def main():
     # Save outputs
     print("\nSaving outputs...")
 
-    combined_df.to_csv(OUTPUT_DIR / "analysis_extended.csv", index=False)
-    print(f"  Saved: analysis_extended.csv ({combined_df.shape})")
-
-    pres_df.to_csv(OUTPUT_DIR / "analysis_extended_pres.csv", index=False)
-    print(f"  Saved: analysis_extended_pres.csv ({pres_df.shape})")
-
-    ca_df.to_csv(OUTPUT_DIR / "analysis_extended_ca_pres.csv", index=False)
-    print(f"  Saved: analysis_extended_ca_pres.csv ({ca_df.shape})")
-
-    # Also save as Stata format for cross-validation
-    try:
-        combined_df.to_stata(OUTPUT_DIR / "analysis_extended.dta", write_index=False)
-        print(f"  Saved: analysis_extended.dta")
-    except Exception as e:
-        print(f"  Note: Could not save Stata format ({e})")
+    outputs = [
+        ("analysis_extended", combined_df),
+        ("analysis_extended_pres", pres_df),
+        ("analysis_extended_ca_pres", ca_df),
+    ]
+    writes = [(f"{name}.parquet ({frame.shape})",
+               partial(frame.to_parquet, OUTPUT_DIR / f"{name}.parquet", engine='pyarrow',
+                       compression='zstd', index=False))
+              for name, frame in outputs]
+    if write_csv:
+        writes += [(f"{name}.csv ({frame.shape})",
+                    partial(frame.to_csv, OUTPUT_DIR / f"{name}.csv", index=False, chunksize=50000))
+                   for name, frame in outputs]
+
+    # The writes are I/O and encoder bound, so overlap them on threads;
+    # results are collected in order to keep the log deterministic
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [(label, executor.submit(write)) for label, write in writes]
+
+        # Also save as Stata format for cross-validation
+        stata_future = None
+        if write_dta:
+            stata_future = executor.submit(save_stata, combined_df,
+                                           OUTPUT_DIR / "analysis_extended.dta")
+
+        for label, future in futures:
+            future.result()
+            print(f"  Saved: {label}")
+
+        if stata_future is not None:
+            try:
+                stata_future.result()
+                print(f"  Saved: analysis_extended.dta")
+            except Exception as e:
+                print(f"  Note: Could not save Stata format ({e})")
 
     print("\n" + "="*60)
     print("PHASE 4 COMPLETE")
@@ -298,4 +455,10 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Merge and prepare the extension dataset")
+    parser.add_argument('--csv', action='store_true',
+                        help="also write CSV copies of the outputs")
+    parser.add_argument('--dta', action='store_true',
+                        help="also write analysis_extended.dta for cross-validation in Stata")
+    args = parser.parse_args()
+    main(write_csv=args.csv, write_dta=args.dta)
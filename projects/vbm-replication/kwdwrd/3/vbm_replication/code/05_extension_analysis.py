@@ -14,8 +14,13 @@ Key analyses:
 5. Robustness checks
 """
 
+import argparse
+import contextlib
+import io
+import math
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
@@ -26,14 +31,14 @@ try:
     HAS_PYFIXEST = True
 except ImportError:
     HAS_PYFIXEST = False
-    print("Warning: pyfixest not available. Using statsmodels instead.")
+    print("Warning: pyfixest not available. Using numpy fallback instead.")
 
+# numba is optional: it compiles the fallback's fixed-effect absorption
 try:
-    import statsmodels.api as sm
-    from statsmodels.regression.linear_model import OLS
-    HAS_STATSMODELS = True
+    import numba
+    HAS_NUMBA = True
 except ImportError:
-    HAS_STATSMODELS = False
+    HAS_NUMBA = False
 
 # Set paths
 PROJECT_DIR = Path(__file__).parent.parent
@@ -50,7 +55,7 @@ FIGURES_DIR.mkdir(parents=True, exist_ok=True)
 def load_data():
     """Load the extended analysis dataset."""
     print("Loading extended dataset...")
-    df = pd.read_csv(DATA_DIR / "combined" / "analysis_extended.csv")
+    df = pd.read_parquet(DATA_DIR / "combined" / "analysis_extended.parquet")
     print(f"  Full panel: {df.shape}")
 
     # Ensure numeric types
@@ -60,29 +65,163 @@ def load_data():
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')
 
-    # Also load original for comparison
-    original = pd.read_stata(PROJECT_DIR / "original" / "data" / "modified" / "analysis.dta")
+    # Whole-number columns in the smallest integer type (columns with NaN
+    # stay float)
+    for col in ['treat', 'year']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    # Integer codes for the fixed-effect and cluster ids, factorized once
+    # here rather than in every regression
+    for code_col, id_col in [('county_code', 'county_id'), ('sty_code', 'state_year_id'),
+                             ('year_code', 'year')]:
+        df[code_col] = pd.factorize(df[id_col])[0].astype(np.int32)
+
+    # California VCA adoption year (NaN for non-adopters), looked up once for
+    # the analyses that need it: one adoption year per county category,
+    # gathered by category code for the California rows
+    vca = pd.read_csv(DATA_DIR / "extension" / "california_vca_adoption.csv",
+                      usecols=['county', 'vca_first_year'])
+    df['county'] = df['county'].astype('category')
+    first_year_by_code = (vca.set_index('county')['vca_first_year']
+                          .reindex(df['county'].cat.categories).to_numpy(dtype=np.float64))
+    codes = df['county'].cat.codes.to_numpy()
+    in_ca = (df['state'] == 'CA').to_numpy() & (codes >= 0)
+    df['vca_first_year'] = np.where(in_ca, first_year_by_code[codes], np.nan)
+    df['vca_ever'] = df['vca_first_year'].notna()
+
+    # Also load original for comparison, from a Parquet copy of the .dta
+    # (rebuilt when the .dta is newer)
+    original_dta = PROJECT_DIR / "original" / "data" / "modified" / "analysis.dta"
+    original_parquet = DATA_DIR / "combined" / "analysis_original.parquet"
+    if (not original_parquet.exists()
+            or original_parquet.stat().st_mtime < original_dta.stat().st_mtime):
+        pd.read_stata(original_dta).to_parquet(original_parquet, engine='pyarrow',
+                                               compression='zstd', index=False)
+    original = pd.read_parquet(original_parquet)
     print(f"  Original: {original.shape}")
 
     return df, original
 
 
+def _group_demean(v, codes, n_groups):
+    """Subtract group means (by integer codes) from each column of v."""
+    counts = np.maximum(np.bincount(codes, minlength=n_groups), 1)
+    means = np.column_stack([
+        np.bincount(codes, weights=col, minlength=n_groups) for col in v.T
+    ]) / counts[:, None]
+    return v - means[codes]
+
+
+def absorb_fixed_effects(v, entity_codes, time_codes, tol=1e-10, max_iter=1000):
+    """
+    Sweep entity and time fixed effects out of the columns of v.
+
+    Alternates entity and time demeaning until the time step no longer
+    moves the data (one pass is exact only on balanced panels).
+
+    Returns (demeaned array, converged flag)
+    """
+    n_entities = entity_codes.max() + 1
+    n_times = time_codes.max() + 1
+    if HAS_NUMBA:
+        return _absorb_compiled(np.ascontiguousarray(v, dtype=np.float64),
+                                entity_codes, time_codes, n_entities, n_times, tol, max_iter)
+    for _ in range(max_iter):
+        v = _group_demean(v, entity_codes, n_entities)
+        v_new = _group_demean(v, time_codes, n_times)
+        if np.max(np.abs(v_new - v)) < tol:
+            return v_new, True
+        v = v_new
+    return v, False
+
+
+if HAS_NUMBA:
+    @numba.njit(parallel=True, cache=True)
+    def _demean_step(v, codes, sums, counts):
+        """Subtract group means from v in place; returns the largest |mean|."""
+        n, k = v.shape
+        sums[:] = 0.0
+        for i in range(n):
+            for j in range(k):
+                sums[codes[i], j] += v[i, j]
+        change = 0.0
+        for g in range(sums.shape[0]):
+            if counts[g] > 0:
+                for j in range(k):
+                    sums[g, j] /= counts[g]
+                    change = max(change, abs(sums[g, j]))
+        for i in numba.prange(n):
+            for j in range(k):
+                v[i, j] -= sums[codes[i], j]
+        return change
+
+    @numba.njit(cache=True)
+    def _absorb_compiled(v, entity_codes, time_codes, n_entities, n_times, tol, max_iter):
+        """absorb_fixed_effects as one compiled loop (v is not modified)."""
+        v = v.copy()
+        k = v.shape[1]
+        counts_e = np.bincount(entity_codes, minlength=n_entities)
+        counts_t = np.bincount(time_codes, minlength=n_times)
+        sums_e = np.zeros((n_entities, k))
+        sums_t = np.zeros((n_times, k))
+        for _ in range(max_iter):
+            _demean_step(v, entity_codes, sums_e, counts_e)
+            # The time step's largest mean is how far it moved the data
+            if _demean_step(v, time_codes, sums_t, counts_t) < tol:
+                return v, True
+        return v, False
+
+
+# Fitted regressions, keyed by sample and variables (see run_twfe_regression)
+_TWFE_CACHE = {}
+
+# [y, x] with the fixed effects absorbed (numpy fallback), keyed the same way
+_ABSORBED_CACHE = {}
+
+
 def run_twfe_regression(df, outcome_var, treatment_var='treat',
-                        entity_var='county_id', time_var='state_year_id',
-                        cluster_var='county_id'):
+                        entity_var='county_code', time_var='sty_code',
+                        cluster_var='county_code', mask=None, parent_mask=None):
     """
     Run two-way fixed effects regression with clustered standard errors.
 
+    The fixed-effect and cluster variables are integer codes (see load_data);
+    codes need not be contiguous within df. mask (boolean array, optional)
+    selects the rows of df to use. Fits are memoized on (df, variables, mask),
+    so analyses that share a sample share one fit.
+
+    parent_mask (boolean array, optional) names an already fitted superset of
+    the sample. The numpy fallback then starts the absorption from the
+    parent's absorbed data: the parent's fixed effects restricted to the
+    subset are subset fixed effects, so the result is unchanged and only
+    the sweeps left to converge are run.
+
     Returns dict with coefficient, SE, t-stat, p-value, N, R2
     """
+    rows = np.ones(len(df), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    key = (id(df), outcome_var, treatment_var, entity_var, time_var, cluster_var,
+           np.packbits(rows).tobytes())
+    cached = _TWFE_CACHE.get(key)
+    # The cached entry holds df itself, so its id cannot be reused by another frame
+    if cached is None or cached[0] is not df:
+        result = _fit_twfe(df, rows, outcome_var, treatment_var, entity_var, time_var, cluster_var,
+                           parent_mask)
+        cached = _TWFE_CACHE[key] = (df, result)
+    # Callers annotate the result, so hand out a copy
+    return dict(cached[1])
+
+
+def _fit_twfe(df, rows, outcome_var, treatment_var, entity_var, time_var, cluster_var,
+              parent_mask=None):
+    """Fit run_twfe_regression's model on the given rows of df."""
     # Get unique columns needed (in case entity_var == cluster_var)
     cols_needed = list(set([outcome_var, treatment_var, entity_var, time_var, cluster_var]))
 
-    # Drop missing values and ensure numeric types
-    df_reg = df[cols_needed].copy()
-    for col in cols_needed:
-        df_reg[col] = pd.to_numeric(df_reg[col], errors='coerce')
-    df_reg = df_reg.dropna()
+    # Drop missing values (all columns are numeric after load_data)
+    complete = df[cols_needed].notna().all(axis=1).to_numpy()
+    keep = rows & complete
+    df_reg = df.loc[keep, cols_needed]
 
     if len(df_reg) < 10:
         return {'coef': np.nan, 'se': np.nan, 't': np.nan, 'p': np.nan,
@@ -123,30 +262,52 @@ def run_twfe_regression(df, outcome_var, treatment_var='treat',
             return {'coef': np.nan, 'se': np.nan, 't': np.nan, 'p': np.nan,
                     'n': len(df_reg), 'r2': np.nan, 'note': str(e)}
     else:
-        # Fallback to manual demeaning with statsmodels
+        # Fallback: within estimator in numpy. Absorb both fixed effects from
+        # [y, x] by alternating projections, then OLS of y on x with a
+        # cluster-robust SE (statsmodels' small-sample scaling, normal p-value)
         try:
-            # Demean by entity and time
-            df_reg = df_reg.copy()
-            df_reg['y_dm'] = df_reg.groupby(entity_var)[outcome_var].transform(lambda x: x - x.mean())
-            df_reg['y_dm'] = df_reg.groupby(time_var)['y_dm'].transform(lambda x: x - x.mean())
-            df_reg['y_dm'] = df_reg['y_dm'] + df_reg[outcome_var].mean()
-
-            df_reg['x_dm'] = df_reg.groupby(entity_var)[treatment_var].transform(lambda x: x - x.mean())
-            df_reg['x_dm'] = df_reg.groupby(time_var)['x_dm'].transform(lambda x: x - x.mean())
-            df_reg['x_dm'] = df_reg['x_dm'] + df_reg[treatment_var].mean()
-
-            X = sm.add_constant(df_reg['x_dm'])
-            model = OLS(df_reg['y_dm'], X).fit(cov_type='cluster',
-                                                cov_kwds={'groups': df_reg[cluster_var]})
+            entity_codes = df_reg[entity_var].to_numpy()
+            time_codes = df_reg[time_var].to_numpy()
+            cluster_codes = df_reg[cluster_var].to_numpy()
+            yx_raw = df_reg[[outcome_var, treatment_var]].to_numpy(dtype=np.float64)
+
+            # Start from the parent sample's absorbed data when it is cached
+            start = yx_raw
+            absorbed_key = (id(df), outcome_var, treatment_var, entity_var, time_var)
+            if parent_mask is not None:
+                parent_keep = np.asarray(parent_mask, dtype=bool) & complete
+                parent = _ABSORBED_CACHE.get(absorbed_key + (np.packbits(parent_keep).tobytes(),))
+                if parent is not None and parent[0] is df and not np.any(keep & ~parent_keep):
+                    start = parent[1][keep[parent_keep]]
+            yx, converged = absorb_fixed_effects(start, entity_codes, time_codes)
+            _ABSORBED_CACHE[absorbed_key + (np.packbits(keep).tobytes(),)] = (df, yx)
+            y, x = yx[:, 0], yx[:, 1]
+
+            # Treatment that only varies at the fixed-effect level is absorbed
+            xx = x @ x
+            x_raw = yx_raw[:, 1] - yx_raw[:, 1].mean()
+            if xx <= 1e-10 * (x_raw @ x_raw):
+                return {'coef': np.nan, 'se': np.nan, 't': np.nan, 'p': np.nan,
+                        'n': len(df_reg), 'r2': np.nan,
+                        'note': 'Treatment collinear with fixed effects'}
+
+            coef = (x @ y) / xx
+            resid = y - coef * x
+            score = np.bincount(cluster_codes, weights=x * resid)
+            n_obs = len(df_reg)
+            n_clusters = np.count_nonzero(np.bincount(cluster_codes))
+            scale = n_clusters / (n_clusters - 1) * (n_obs - 1) / (n_obs - 2)
+            se = np.sqrt(scale * (score @ score)) / xx
+            t_stat = coef / se
 
             return {
-                'coef': model.params['x_dm'],
-                'se': model.bse['x_dm'],
-                't': model.tvalues['x_dm'],
-                'p': model.pvalues['x_dm'],
-                'n': len(df_reg),
-                'r2': model.rsquared,
-                'note': 'Manual demeaning'
+                'coef': coef,
+                'se': se,
+                't': t_stat,
+                'p': math.erfc(abs(t_stat) / math.sqrt(2)),
+                'n': n_obs,
+                'r2': 1 - (resid @ resid) / (y @ y),
+                'note': 'Manual demeaning' if converged else 'Manual demeaning (not converged)'
             }
         except Exception as e:
             return {'coef': np.nan, 'se': np.nan, 't': np.nan, 'p': np.nan,
@@ -172,9 +333,10 @@ def analysis_1_extended_panel(df, original):
     pres_years_orig = [2000, 2004, 2008, 2012, 2016]
     pres_years_ext = [2000, 2004, 2008, 2012, 2016, 2020]
 
+    year = df['year'].to_numpy()
+
     # Original period (replication)
-    df_orig = df[df['year'].isin(pres_years_orig)].copy()
-    result_orig = run_twfe_regression(df_orig, outcome)
+    result_orig = run_twfe_regression(df, outcome, mask=np.isin(year, pres_years_orig))
     result_orig['sample'] = 'Original (2000-2016)'
     result_orig['outcome'] = outcome
     results.append(result_orig)
@@ -185,8 +347,7 @@ def analysis_1_extended_panel(df, original):
     print(f"  N:           {result_orig['n']}")
 
     # Extended period (with 2020)
-    df_ext = df[df['year'].isin(pres_years_ext)].copy()
-    result_ext = run_twfe_regression(df_ext, outcome)
+    result_ext = run_twfe_regression(df, outcome, mask=np.isin(year, pres_years_ext))
     result_ext['sample'] = 'Extended (2000-2020)'
     result_ext['outcome'] = outcome
     results.append(result_ext)
@@ -197,25 +358,33 @@ def analysis_1_extended_panel(df, original):
     print(f"  N:           {result_ext['n']}")
 
     # 2020 only (cross-sectional comparison)
-    df_2020 = df[df['year'] == 2020].copy()
     # Simple OLS for 2020 cross-section (no FE needed for single year)
-    df_2020_reg = df_2020[['dem_share_pres', 'treat', 'state']].dropna()
+    df_2020_reg = df.loc[df['year'] == 2020, ['dem_share_pres', 'treat', 'state']].dropna()
 
     if len(df_2020_reg) > 10:
-        # Add state fixed effects
-        df_2020_reg = pd.get_dummies(df_2020_reg, columns=['state'], drop_first=True)
-        X_cols = ['treat'] + [c for c in df_2020_reg.columns if c.startswith('state_')]
-        X = sm.add_constant(df_2020_reg[X_cols].astype(float))
-        y = df_2020_reg['dem_share_pres'].astype(float)
-        model_2020 = OLS(y, X).fit(cov_type='HC1')
+        # State fixed effects by within-state demeaning (Frisch-Waugh-Lovell):
+        # the treat coefficient and residuals equal those of OLS on a
+        # constant, treat and state dummies; the HC1 SE counts those K params
+        state_codes, states = pd.factorize(df_2020_reg['state'])
+        yx_raw = df_2020_reg[['dem_share_pres', 'treat']].to_numpy(dtype=np.float64)
+        yx = _group_demean(yx_raw, state_codes, len(states))
+        y, x = yx[:, 0], yx[:, 1]
+
+        n_obs = len(df_2020_reg)
+        n_params = len(states) + 1
+        xx = x @ x
+        coef = (x @ y) / xx
+        resid = y - coef * x
+        se = np.sqrt(n_obs / (n_obs - n_params) * ((x * resid) @ (x * resid))) / xx
+        y_raw = yx_raw[:, 0] - yx_raw[:, 0].mean()
 
         result_2020 = {
-            'coef': model_2020.params['treat'],
-            'se': model_2020.bse['treat'],
-            't': model_2020.tvalues['treat'],
-            'p': model_2020.pvalues['treat'],
-            'n': len(df_2020_reg),
-            'r2': model_2020.rsquared,
+            'coef': coef,
+            'se': se,
+            't': coef / se,
+            'p': math.erfc(abs(coef / se) / math.sqrt(2)),
+            'n': n_obs,
+            'r2': 1 - (resid @ resid) / (y_raw @ y_raw),
             'sample': '2020 only (cross-section)',
             'outcome': outcome,
             'note': 'State FE, robust SE'
@@ -245,13 +414,10 @@ def analysis_2_california_vca(df):
     results = []
 
     # Filter to California only
-    ca = df[df['state'] == 'CA'].copy()
+    ca = df[df['state'] == 'CA']
 
     # Presidential years
-    ca_pres = ca[ca['year'].isin([2016, 2020])].copy()
-
-    # Create California-specific year FE
-    ca_pres['year_fe'] = ca_pres['year'].astype(str)
+    ca_pres = ca[ca['year'].isin([2016, 2020])]
 
     outcome = 'dem_share_pres'
 
@@ -262,28 +428,16 @@ def analysis_2_california_vca(df):
     # Treatment: VCA counties in 2020
     ca_pres['post'] = (ca_pres['year'] == 2020).astype(int)
 
-    # Calculate means
-    vca_2016 = ca_pres[(ca_pres['treat'] == 1) & (ca_pres['year'] == 2016)][outcome].mean()
-    vca_2020 = ca_pres[(ca_pres['treat'] == 1) & (ca_pres['year'] == 2020)][outcome].mean()
-    nonvca_2016 = ca_pres[(ca_pres['treat'] == 0) & (ca_pres['year'] == 2016)][outcome].mean()
-    nonvca_2020 = ca_pres[(ca_pres['treat'] == 0) & (ca_pres['year'] == 2020)][outcome].mean()
-
-    # Note: treat in 2016 means adopted by 2018, so we need to be careful
-    # Actually, we should compare 2018 adopters vs never-adopters
-
-    # Better approach: Create VCA indicator based on adoption
-    # Load VCA data
-    vca_data = pd.read_csv(DATA_DIR / "extension" / "california_vca_adoption.csv")
-    vca_counties = set(vca_data['county'].tolist())
+    # Note: treat in 2016 means adopted by 2018, so compare VCA adopters
+    # (vca_ever, from load_data) vs never-adopters rather than treated vs
+    # untreated
 
-    # Counties that adopted VCA by 2020
-    ca_pres['vca_ever'] = ca_pres['county'].isin(vca_counties).astype(int)
-
-    # DiD estimate
-    vca_2016 = ca_pres[(ca_pres['vca_ever'] == 1) & (ca_pres['year'] == 2016)][outcome].mean()
-    vca_2020 = ca_pres[(ca_pres['vca_ever'] == 1) & (ca_pres['year'] == 2020)][outcome].mean()
-    nonvca_2016 = ca_pres[(ca_pres['vca_ever'] == 0) & (ca_pres['year'] == 2016)][outcome].mean()
-    nonvca_2020 = ca_pres[(ca_pres['vca_ever'] == 0) & (ca_pres['year'] == 2020)][outcome].mean()
+    # DiD estimate: the four cell means in one pass, cell = 2 * vca_ever + post
+    valid = ca_pres[outcome].notna().to_numpy()
+    cell = (2 * ca_pres['vca_ever'].to_numpy() + ca_pres['post'].to_numpy())[valid]
+    cell_means = (np.bincount(cell, weights=ca_pres[outcome].to_numpy()[valid], minlength=4)
+                  / np.bincount(cell, minlength=4))
+    nonvca_2016, nonvca_2020, vca_2016, vca_2020 = cell_means
 
     did_estimate = (vca_2020 - vca_2016) - (nonvca_2020 - nonvca_2016)
 
@@ -300,9 +454,9 @@ def analysis_2_california_vca(df):
             ca_pres['treat_post'] = ca_pres['vca_ever'] * ca_pres['post']
 
             model = pf.feols(
-                f"{outcome} ~ treat_post | county_id + year",
+                f"{outcome} ~ treat_post | county_code + year_code",
                 data=ca_pres,
-                vcov={'CRV1': 'county_id'}
+                vcov={'CRV1': 'county_code'}
             )
 
             try:
@@ -335,8 +489,7 @@ def analysis_2_california_vca(df):
     print("\n2020 Cross-section: VCA vs Non-VCA counties")
     print("-" * 40)
 
-    ca_2020 = ca[ca['year'] == 2020].copy()
-    ca_2020['vca_ever'] = ca_2020['county'].isin(vca_counties).astype(int)
+    ca_2020 = ca[ca['year'] == 2020]
 
     vca_mean = ca_2020[ca_2020['vca_ever'] == 1][outcome].mean()
     nonvca_mean = ca_2020[ca_2020['vca_ever'] == 0][outcome].mean()
@@ -362,28 +515,28 @@ def analysis_3_heterogeneity(df):
     outcome = 'dem_share_pres'
 
     # Calculate baseline partisanship (2016 presidential vote)
-    baseline = df[df['year'] == 2016][['county_id', 'dem_share_pres']].copy()
+    baseline = df.loc[df['year'] == 2016, ['county_id', 'dem_share_pres']]
     baseline = baseline.rename(columns={'dem_share_pres': 'baseline_dem'})
 
     # Merge baseline to full dataset
     df_het = df.merge(baseline, on='county_id', how='left')
 
-    # Create terciles
-    terciles = baseline['baseline_dem'].quantile([0.33, 0.67])
-    df_het['partisan_group'] = pd.cut(
-        df_het['baseline_dem'],
-        bins=[-np.inf, terciles.iloc[0], terciles.iloc[1], np.inf],
-        labels=['Republican', 'Swing', 'Democratic']
-    )
+    # Create terciles: group 0/1/2 for (-inf, q33], (q33, q67], (q67, inf)
+    # as pd.cut would bin them, -1 where there is no baseline
+    groups = ['Republican', 'Swing', 'Democratic']
+    edges = baseline['baseline_dem'].quantile([0.33, 0.67]).to_numpy()
+    baseline_dem = df_het['baseline_dem'].to_numpy()
+    df_het['partisan_group'] = np.where(np.isnan(baseline_dem), -1,
+                                        np.searchsorted(edges, baseline_dem, side='left'))
 
     # Filter to 2020
-    df_2020 = df_het[df_het['year'] == 2020].copy()
+    df_2020 = df_het[df_het['year'] == 2020]
 
     print("\n2020 Democratic Vote Share by VBM Status and Baseline Partisanship:")
     print("-" * 60)
 
-    for group in ['Republican', 'Swing', 'Democratic']:
-        subset = df_2020[df_2020['partisan_group'] == group]
+    for code, group in enumerate(groups):
+        subset = df_2020[df_2020['partisan_group'] == code]
         vbm_mean = subset[subset['treat'] == 1][outcome].mean()
         novbm_mean = subset[subset['treat'] == 0][outcome].mean()
         n_vbm = (subset['treat'] == 1).sum()
@@ -417,24 +570,17 @@ def analysis_4_event_study(df):
     print("ANALYSIS 4: EVENT STUDY (CALIFORNIA VCA)")
     print("="*60)
 
-    # Load VCA adoption data
-    vca_data = pd.read_csv(DATA_DIR / "extension" / "california_vca_adoption.csv")
-
-    # Filter to California
-    ca = df[df['state'] == 'CA'].copy()
-
-    # Merge adoption year
-    ca = ca.merge(vca_data[['county', 'vca_first_year']], on='county', how='left')
-    ca = ca.rename(columns={'vca_first_year': 'first_vca_year'})
+    # Filter to California (adoption year joined in load_data)
+    ca = df[df['state'] == 'CA']
 
     # Filter to presidential years
-    ca_pres = ca[ca['year'].isin([2000, 2004, 2008, 2012, 2016, 2020])].copy()
+    ca_pres = ca[ca['year'].isin([2000, 2004, 2008, 2012, 2016, 2020])]
 
     # Create event time (years since adoption)
-    ca_pres['event_time'] = ca_pres['year'] - ca_pres['first_vca_year']
+    ca_pres['event_time'] = ca_pres['year'] - ca_pres['vca_first_year']
 
     # For never-adopters, set event_time to a large negative (control group)
-    ca_pres.loc[ca_pres['first_vca_year'].isna(), 'event_time'] = -999
+    ca_pres.loc[ca_pres['vca_first_year'].isna(), 'event_time'] = -999
 
     outcome = 'dem_share_pres'
 
@@ -442,9 +588,22 @@ def analysis_4_event_study(df):
     print("-" * 50)
 
     # Focus on VCA adopters
-    adopters = ca_pres[ca_pres['first_vca_year'].notna()].copy()
-
-    event_means = adopters.groupby('event_time')[outcome].agg(['mean', 'std', 'count'])
+    adopters = ca_pres[ca_pres['vca_first_year'].notna()]
+
+    # Mean, std (ddof=1) and count of the observed outcome per event time,
+    # each one bincount over the event-time codes
+    y = adopters[outcome].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(y)
+    y = y[valid]
+    event_times, bins = np.unique(adopters['event_time'].to_numpy()[valid].astype(np.int32),
+                                  return_inverse=True)
+    count = np.bincount(bins, minlength=len(event_times))
+    mean = np.bincount(bins, weights=y, minlength=len(event_times)) / count
+    sq_dev = np.bincount(bins, weights=(y - mean[bins]) ** 2, minlength=len(event_times))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(sq_dev / (count - 1))
+    event_means = pd.DataFrame({'mean': mean, 'std': std, 'count': count},
+                               index=pd.Index(event_times, name='event_time'))
     event_means = event_means[event_means['count'] >= 3]  # At least 3 obs
 
     for et in sorted(event_means.index):
@@ -477,43 +636,48 @@ def analysis_5_robustness(df):
     outcome = 'dem_share_pres'
     pres_years = [2000, 2004, 2008, 2012, 2016, 2020]
 
-    df_pres = df[df['year'].isin(pres_years)].copy()
+    # Samples as row masks over df; the baseline and pre-COVID samples are
+    # the extended and original samples of analysis 1, so their fits are
+    # reused, and every subset starts from the baseline's absorbed data
+    year = df['year'].to_numpy()
+    is_pres_year = np.isin(year, pres_years)
+    state = df['state']
 
     # 1. Baseline: All states
     print("\n1. Baseline (all states, 2000-2020):")
-    result = run_twfe_regression(df_pres, outcome)
+    result = run_twfe_regression(df, outcome, mask=is_pres_year)
     print(f"   Coef: {result['coef']:.4f}, SE: {result['se']:.4f}, N: {result['n']}")
     result['spec'] = 'Baseline (all states)'
     results.append(result)
 
     # 2. Exclude Washington (always treated after 2011)
     print("\n2. Exclude Washington:")
-    df_no_wa = df_pres[df_pres['state'] != 'WA'].copy()
-    result = run_twfe_regression(df_no_wa, outcome)
+    result = run_twfe_regression(df, outcome, mask=is_pres_year & (state != 'WA').to_numpy(),
+                                 parent_mask=is_pres_year)
     print(f"   Coef: {result['coef']:.4f}, SE: {result['se']:.4f}, N: {result['n']}")
     result['spec'] = 'Exclude WA'
     results.append(result)
 
     # 3. Exclude Utah (always treated after 2019)
     print("\n3. Exclude Utah:")
-    df_no_ut = df_pres[df_pres['state'] != 'UT'].copy()
-    result = run_twfe_regression(df_no_ut, outcome)
+    result = run_twfe_regression(df, outcome, mask=is_pres_year & (state != 'UT').to_numpy(),
+                                 parent_mask=is_pres_year)
     print(f"   Coef: {result['coef']:.4f}, SE: {result['se']:.4f}, N: {result['n']}")
     result['spec'] = 'Exclude UT'
     results.append(result)
 
     # 4. California only
     print("\n4. California only:")
-    df_ca = df_pres[df_pres['state'] == 'CA'].copy()
-    result = run_twfe_regression(df_ca, outcome)
+    result = run_twfe_regression(df, outcome, mask=is_pres_year & (state == 'CA').to_numpy(),
+                                 parent_mask=is_pres_year)
     print(f"   Coef: {result['coef']:.4f}, SE: {result['se']:.4f}, N: {result['n']}")
     result['spec'] = 'CA only'
     results.append(result)
 
     # 5. Pre-COVID only (exclude 2020)
     print("\n5. Pre-COVID (2000-2016):")
-    df_precovid = df_pres[df_pres['year'] < 2020].copy()
-    result = run_twfe_regression(df_precovid, outcome)
+    result = run_twfe_regression(df, outcome, mask=is_pres_year & (year < 2020),
+                                 parent_mask=is_pres_year)
     print(f"   Coef: {result['coef']:.4f}, SE: {result['se']:.4f}, N: {result['n']}")
     result['spec'] = 'Pre-COVID (2000-2016)'
     results.append(result)
@@ -567,8 +731,23 @@ def create_summary_table(results_dict):
     return summary_df
 
 
-def main():
-    """Main execution."""
+def run_captured(analysis, *args):
+    """Run analysis(*args), returning (result, the text it printed)."""
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        result = analysis(*args)
+    return result, buffer.getvalue()
+
+
+def main(max_workers=1):
+    """
+    Main execution.
+
+    The five analyses only read df, so with max_workers > 1 they run in
+    separate processes; each one's printed report is replayed in order.
+    Analysis 5 then cannot reuse analysis 1's fits, so this only pays off
+    with a slow backend (pyfixest).
+    """
     print("="*60)
     print("PHASE 5: EXTENSION ANALYSIS")
     print("Thompson et al. (2020) - Post-COVID Extension")
@@ -577,23 +756,26 @@ def main():
     # Load data
     df, original = load_data()
 
+    analyses = {
+        'extended_panel': (analysis_1_extended_panel, df, original),
+        'california': (analysis_2_california_vca, df),
+        'heterogeneity': (analysis_3_heterogeneity, df),
+        'event_study': (analysis_4_event_study, df),
+        'robustness': (analysis_5_robustness, df),
+    }
+
     # Store all results
     results = {}
-
-    # Analysis 1: Extended panel
-    results['extended_panel'] = analysis_1_extended_panel(df, original)
-
-    # Analysis 2: California VCA
-    results['california'] = analysis_2_california_vca(df)
-
-    # Analysis 3: Heterogeneity
-    results['heterogeneity'] = analysis_3_heterogeneity(df)
-
-    # Analysis 4: Event study
-    results['event_study'] = analysis_4_event_study(df)
-
-    # Analysis 5: Robustness
-    results['robustness'] = analysis_5_robustness(df)
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {name: executor.submit(run_captured, *call)
+                       for name, call in analyses.items()}
+            for name, future in futures.items():
+                results[name], output = future.result()
+                print(output, end='')
+    else:
+        for name, (analysis, *args) in analyses.items():
+            results[name] = analysis(*args)
 
     # Create summary
     summary = create_summary_table(results)
@@ -633,4 +815,8 @@ def main():
 
 
 if __name__ == "__main__":
-    results = main()
+    parser = argparse.ArgumentParser(description="Run the post-COVID extension analysis")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes for the five analyses (default: 1)")
+    args = parser.parse_args()
+    results = main(max_workers=args.jobs)